@@ -1,15 +1,55 @@
+import argparse
+import ctypes
 import pygame
 from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
+from OpenGL.GL import shaders
 import numpy as np
 import time
+from mesh_loader import load_mesh
+
+# Interleaved face vertex layout: position (3), RGBA colour (4), texcoord (2)
+FACE_STRIDE = 9 * 4
+COLOR_OFFSET = ctypes.c_void_p(3 * 4)
+TEXCOORD_OFFSET = ctypes.c_void_p(7 * 4)
+
+# Instanced mode: N (key) cycles the instance count; instances are scattered
+# through a cube whose volume grows with the count
+INSTANCE_COUNTS = (1000, 10000, 100000)
+INSTANCE_SPACING = 1.0
+INSTANCE_SCALE = 0.25
+CAPTION = "Advanced 3D Transformation Explorer"
+MESH_COLOR = (0.8, 0.8, 0.85, 1.0)
+
+# The fixed-function view and cube transform come in through
+# gl_ModelViewProjectionMatrix; each instance adds its own model matrix, read
+# from a per-instance attribute (four vec4 columns)
+INSTANCE_VERTEX_SHADER = """
+#version 120
+attribute mat4 model;
+varying vec2 texcoord;
+void main() {
+    gl_FrontColor = gl_Color;
+    texcoord = gl_MultiTexCoord0.xy;
+    gl_Position = gl_ModelViewProjectionMatrix * model * gl_Vertex;
+}
+"""
+INSTANCE_FRAGMENT_SHADER = """
+#version 120
+uniform bool textured;
+uniform sampler2D checker;
+varying vec2 texcoord;
+void main() {
+    gl_FragColor = textured ? gl_Color * texture2D(checker, texcoord) : gl_Color;
+}
+"""
 
 class CubeVisualizer:
-    def __init__(self):
+    def __init__(self, mesh_path=None):
         pygame.init()
         self.display = (1200, 700)
-        pygame.display.set_caption("Advanced 3D Transformation Explorer")
+        pygame.display.set_caption(CAPTION)
         pygame.display.set_mode(self.display, DOUBLEBUF | OPENGL | RESIZABLE)
         self.clock = pygame.time.Clock()
 
@@ -34,15 +74,34 @@ class CubeVisualizer:
         # Projection state
         self.perspective = True
 
+        # Instanced mode state
+        self.instanced = False
+        self.instance_program = None
+        self.instance_vbo = None
+        self.instance_count = 0
+        self.instances_dirty = False
+        self.caption_time = 0
+
         self.rotation_speed = 1.0
         self.move_speed = 0.1
         self.scale_speed = 0.05
 
-        self.init_geometry()
+        self.init_geometry(mesh_path)
         self.init_opengl()
         self.init_texture()
+        self.init_buffers()
+
+    def init_geometry(self, mesh_path=None):
+        # A loaded mesh replaces the cube; it is scaled and centred to the
+        # cube's 2x2x2 box by `geometry_matrix`, which the single draw and every
+        # instance matrix apply first
+        self.mesh = load_mesh(mesh_path) if mesh_path else None
+        self.geometry_matrix = np.identity(4, dtype=np.float32)
+        if self.mesh is not None:
+            size = 2 / max(self.mesh.size, 1e-9)
+            self.geometry_matrix[:3, :3] *= size
+            self.geometry_matrix[:3, 3] = -self.mesh.center * size
 
-    def init_geometry(self):
         self.vertices = np.array([
             [1, 1, -1],
             [1, -1, -1],
@@ -83,6 +142,8 @@ class CubeVisualizer:
         glEnable(GL_BLEND)
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
         glClearColor(0.1, 0.1, 0.1, 1.0)
+        # Mesh normals are unit length before geometry_matrix scales them
+        glEnable(GL_NORMALIZE)
         self.set_projection()
 
     def init_texture(self):
@@ -96,14 +157,115 @@ class CubeVisualizer:
         glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
         glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
 
+    def init_buffers(self):
+        # All geometry lives in buffer objects on the GPU, uploaded once; a
+        # frame only binds them and issues one draw call per part
+        face_data = [list(self.vertices[vertex]) + list(self.face_colors[i]) + [vertex % 2, (vertex // 2) % 2]
+                     for i, face in enumerate(self.faces) for vertex in face]
+        face_data = np.array(face_data, dtype=np.float32)
+        self.face_count = len(face_data)
+        self.face_vbo = self.upload(GL_ARRAY_BUFFER, face_data)
+
+        # Edges index the 8 corners
+        self.vertex_vbo = self.upload(GL_ARRAY_BUFFER, self.vertices)
+        edge_indices = np.array(self.edges, dtype=np.uint32).ravel()
+        self.edge_count = len(edge_indices)
+        self.edge_ibo = self.upload(GL_ELEMENT_ARRAY_BUFFER, edge_indices)
+
+        lines = []
+        for i in range(-10, 11):
+            lines += [(i, 0, -10), (i, 0, 10), (-10, 0, i), (10, 0, i)]
+        grid_data = np.array(lines, dtype=np.float32)
+        self.grid_count = len(grid_data)
+        self.grid_vbo = self.upload(GL_ARRAY_BUFFER, grid_data)
+
+        # Mesh arrays may be memory-mapped from the cache; they go to the GPU
+        # as they are, without a copy in between
+        if self.mesh is not None:
+            self.mesh_vbo = self.upload(GL_ARRAY_BUFFER, self.mesh.vertices)
+            self.mesh_normal_vbo = self.upload(GL_ARRAY_BUFFER, self.mesh.normals)
+            self.mesh_ibo = self.upload(GL_ELEMENT_ARRAY_BUFFER, self.mesh.indices)
+            self.mesh_count = self.mesh.indices.size
+
+    def upload(self, target, data):
+        buffer = glGenBuffers(1)
+        glBindBuffer(target, buffer)
+        glBufferData(target, data.nbytes, data, GL_STATIC_DRAW)
+        glBindBuffer(target, 0)
+        return buffer
+
+    def delete_buffers(self):
+        glDeleteBuffers(4, [self.face_vbo, self.vertex_vbo, self.edge_ibo, self.grid_vbo])
+        if self.mesh is not None:
+            glDeleteBuffers(3, [self.mesh_vbo, self.mesh_normal_vbo, self.mesh_ibo])
+        if self.instance_program is not None:
+            glDeleteBuffers(1, [self.instance_vbo])
+            glDeleteProgram(self.instance_program)
+
+    def init_instancing(self):
+        # Needs GLSL 1.20 plus instanced arrays (GL 3.3 or ARB_instanced_arrays)
+        try:
+            self.instance_program = shaders.compileProgram(
+                shaders.compileShader(INSTANCE_VERTEX_SHADER, GL_VERTEX_SHADER),
+                shaders.compileShader(INSTANCE_FRAGMENT_SHADER, GL_FRAGMENT_SHADER))
+            if not bool(glVertexAttribDivisor) or not bool(glDrawArraysInstanced):
+                raise RuntimeError("instanced drawing is not supported by this driver")
+        except Exception as e:
+            print(f"\nInstanced mode unavailable: {e}")
+            self.instance_program = None
+            return False
+        self.model_location = glGetAttribLocation(self.instance_program, "model")
+        self.textured_location = glGetUniformLocation(self.instance_program, "textured")
+        self.checker_location = glGetUniformLocation(self.instance_program, "checker")
+        self.instance_vbo = glGenBuffers(1)
+        self.init_instances(INSTANCE_COUNTS[0])
+        return True
+
+    def init_instances(self, count):
+        rng = np.random.default_rng(0)
+        side = INSTANCE_SPACING * np.cbrt(count)
+        self.instance_count = count
+        self.instance_offsets = rng.uniform(-side / 2, side / 2, (count, 3)).astype(np.float32)
+        self.instance_angles = rng.uniform(0, 360, (count, 3)).astype(np.float32)
+        self.instance_matrices = np.zeros((count, 4, 4), dtype=np.float32)
+        self.instance_matrices[:, 3, 3] = 1
+        self.camera_distance = max(self.camera_distance, side * 1.5)
+        self.instances_dirty = True
+
+    def update_instances(self):
+        # Every model matrix at once, translate * Rx * Ry * Rz * scale like the
+        # single cube's glTranslatef/glRotatef calls, then one upload of the
+        # whole array (column-major per instance, as GL expects)
+        ax, ay, az = np.radians(self.instance_angles).T
+        cx, sx = np.cos(ax), np.sin(ax)
+        cy, sy = np.cos(ay), np.sin(ay)
+        cz, sz = np.cos(az), np.sin(az)
+        m = self.instance_matrices
+        m[:, 0, 0] = cy * cz
+        m[:, 0, 1] = -cy * sz
+        m[:, 0, 2] = sy
+        m[:, 1, 0] = sx * sy * cz + cx * sz
+        m[:, 1, 1] = -sx * sy * sz + cx * cz
+        m[:, 1, 2] = -sx * cy
+        m[:, 2, 0] = -cx * sy * cz + sx * sz
+        m[:, 2, 1] = cx * sy * sz + sx * cz
+        m[:, 2, 2] = cx * cy
+        m[:, :3, :3] *= INSTANCE_SCALE
+        m[:, :3, 3] = self.instance_offsets
+        data = np.ascontiguousarray((m @ self.geometry_matrix).transpose(0, 2, 1))
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_STREAM_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.instances_dirty = False
+
     def set_projection(self):
         glMatrixMode(GL_PROJECTION)
         glLoadIdentity()
         aspect = self.display[0] / self.display[1]
         if self.perspective:
-            gluPerspective(45, aspect, 0.1, 100.0)
+            gluPerspective(45, aspect, 0.1, 500.0)
         else:
-            glOrtho(-5*aspect, 5*aspect, -5, 5, 0.1, 100.0)
+            glOrtho(-5*aspect, 5*aspect, -5, 5, 0.1, 500.0)
         glMatrixMode(GL_MODELVIEW)
 
     def handle_events(self):
@@ -141,6 +303,12 @@ class CubeVisualizer:
                     self.save_screenshot()
                 elif event.key == K_m:
                     self.print_matrix()
+                elif event.key == K_i:
+                    if self.instance_program is not None or self.init_instancing():
+                        self.instanced = not self.instanced
+                elif event.key == K_n and self.instanced:
+                    k = INSTANCE_COUNTS.index(self.instance_count)
+                    self.init_instances(INSTANCE_COUNTS[(k + 1) % len(INSTANCE_COUNTS)])
             if event.type == MOUSEBUTTONDOWN:
                 if event.button == 4:
                     self.camera_distance = max(2, self.camera_distance - 0.5)
@@ -220,38 +388,119 @@ class CubeVisualizer:
 
     def draw_grid(self):
         glColor3f(0.5, 0.5, 0.5)
-        glBegin(GL_LINES)
-        for i in range(-10, 11):
-            glVertex3f(i, 0, -10)
-            glVertex3f(i, 0, 10)
-            glVertex3f(-10, 0, i)
-            glVertex3f(10, 0, i)
-        glEnd()
+        glBindBuffer(GL_ARRAY_BUFFER, self.grid_vbo)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, None)
+        glDrawArrays(GL_LINES, 0, self.grid_count)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def bind_mesh(self):
+        glColor4f(*MESH_COLOR)
+        glBindBuffer(GL_ARRAY_BUFFER, self.mesh_vbo)
+        glVertexPointer(3, GL_FLOAT, 0, None)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, self.mesh_normal_vbo)
+        glNormalPointer(GL_FLOAT, 0, None)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.mesh_ibo)
+
+    def unbind_mesh(self):
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw_mesh(self):
+        # Wireframe needs no separate edge list: GL_LINE polygon mode outlines
+        # the triangles
+        glPushMatrix()
+        glMultMatrixf(self.geometry_matrix.T)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        self.bind_mesh()
+        glDrawElements(GL_TRIANGLES, self.mesh_count, GL_UNSIGNED_INT, None)
+        self.unbind_mesh()
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glPopMatrix()
 
     def draw_cube(self):
-        if self.texture_enabled:
-            glEnable(GL_TEXTURE_2D)
-            glBindTexture(GL_TEXTURE_2D, self.texture_id)
-
+        if self.mesh is not None:
+            self.draw_mesh()
+            return
+        glEnableClientState(GL_VERTEX_ARRAY)
         if not self.wireframe:
-            glBegin(GL_QUADS)
-            for i, face in enumerate(self.faces):
-                glColor4fv(self.face_colors[i])
-                for vertex in face:
-                    if self.texture_enabled:
-                        glTexCoord2f((vertex % 2), ((vertex//2) % 2))
-                    glVertex3fv(self.vertices[vertex])
-            glEnd()
-
-        if self.texture_enabled:
-            glDisable(GL_TEXTURE_2D)
+            if self.texture_enabled:
+                glEnable(GL_TEXTURE_2D)
+                glBindTexture(GL_TEXTURE_2D, self.texture_id)
+                glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+
+            glBindBuffer(GL_ARRAY_BUFFER, self.face_vbo)
+            glEnableClientState(GL_COLOR_ARRAY)
+            glVertexPointer(3, GL_FLOAT, FACE_STRIDE, None)
+            glColorPointer(4, GL_FLOAT, FACE_STRIDE, COLOR_OFFSET)
+            glTexCoordPointer(2, GL_FLOAT, FACE_STRIDE, TEXCOORD_OFFSET)
+            glDrawArrays(GL_QUADS, 0, self.face_count)
+            glDisableClientState(GL_COLOR_ARRAY)
+
+            if self.texture_enabled:
+                glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+                glDisable(GL_TEXTURE_2D)
 
         glColor3f(1, 1, 1)
-        glBegin(GL_LINES)
-        for edge in self.edges:
-            for vertex in edge:
-                glVertex3fv(self.vertices[vertex])
-        glEnd()
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_vbo)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.edge_ibo)
+        glVertexPointer(3, GL_FLOAT, 0, None)
+        glDrawElements(GL_LINES, self.edge_count, GL_UNSIGNED_INT, None)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+    def draw_instances(self):
+        # The cube's (or mesh's) buffers drawn once per instance by a single
+        # call each for faces and edges; the model matrix attribute advances per
+        # instance
+        glUseProgram(self.instance_program)
+        glUniform1i(self.textured_location, int(self.texture_enabled))
+        glUniform1i(self.checker_location, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        for column in range(4):
+            location = self.model_location + column
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, 4, GL_FLOAT, GL_FALSE, 64, ctypes.c_void_p(16 * column))
+            glVertexAttribDivisor(location, 1)
+
+        glEnableClientState(GL_VERTEX_ARRAY)
+        if self.mesh is not None:
+            glUniform1i(self.textured_location, 0)
+            self.bind_mesh()
+            glDrawElementsInstanced(GL_TRIANGLES, self.mesh_count, GL_UNSIGNED_INT, None, self.instance_count)
+            self.unbind_mesh()
+        elif not self.wireframe:
+            if self.texture_enabled:
+                glBindTexture(GL_TEXTURE_2D, self.texture_id)
+            glBindBuffer(GL_ARRAY_BUFFER, self.face_vbo)
+            glEnableClientState(GL_COLOR_ARRAY)
+            glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+            glVertexPointer(3, GL_FLOAT, FACE_STRIDE, None)
+            glColorPointer(4, GL_FLOAT, FACE_STRIDE, COLOR_OFFSET)
+            glTexCoordPointer(2, GL_FLOAT, FACE_STRIDE, TEXCOORD_OFFSET)
+            glDrawArraysInstanced(GL_QUADS, 0, self.face_count, self.instance_count)
+            glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+            glDisableClientState(GL_COLOR_ARRAY)
+
+        if self.mesh is None:
+            glUniform1i(self.textured_location, 0)
+            glColor3f(1, 1, 1)
+            glBindBuffer(GL_ARRAY_BUFFER, self.vertex_vbo)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.edge_ibo)
+            glVertexPointer(3, GL_FLOAT, 0, None)
+            glDrawElementsInstanced(GL_LINES, self.edge_count, GL_UNSIGNED_INT, None, self.instance_count)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+        for column in range(4):
+            glVertexAttribDivisor(self.model_location + column, 0)
+            glDisableVertexAttribArray(self.model_location + column)
+        glUseProgram(0)
 
     def update(self, dt):
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
@@ -273,11 +522,21 @@ class CubeVisualizer:
         glRotatef(self.rotation[0], 1, 0, 0)
         glRotatef(self.rotation[1], 0, 1, 0)
         glRotatef(self.rotation[2], 0, 0, 1)
-        self.draw_cube()
+        if self.instanced:
+            if self.instances_dirty:
+                self.update_instances()
+            self.draw_instances()
+        else:
+            self.draw_cube()
         glPopMatrix()
 
         if self.auto_rotate:
-            self.rotation[1] += self.rotation_speed * dt * 60
+            if self.instanced:
+                # Every instance spins about its own y axis, in one array update
+                self.instance_angles[:, 1] += self.rotation_speed * dt * 60
+                self.instances_dirty = True
+            else:
+                self.rotation[1] += self.rotation_speed * dt * 60
 
         pygame.display.flip()
 
@@ -290,9 +549,16 @@ class CubeVisualizer:
             running = self.handle_events()
             self.update(dt)
             fps = self.clock.get_fps()
-            print(f"\rFPS: {fps:.1f} | AutoRotate: {self.auto_rotate} | Lighting: {self.lighting} | Culling: {self.culling} | Wireframe: {self.wireframe} | Grid: {self.grid} | Texture: {self.texture_enabled} | Projection: {'Perspective' if self.perspective else 'Orthographic'}", end="")
+            instances = self.instance_count if self.instanced else 1
+            if time.time() - self.caption_time > 0.5:
+                pygame.display.set_caption(f"{CAPTION} - {instances} instances - {fps:.0f} FPS")
+                self.caption_time = time.time()
+            print(f"\rFPS: {fps:.1f} | Instances: {instances} | AutoRotate: {self.auto_rotate} | Lighting: {self.lighting} | Culling: {self.culling} | Wireframe: {self.wireframe} | Grid: {self.grid} | Texture: {self.texture_enabled} | Projection: {'Perspective' if self.perspective else 'Orthographic'}", end="")
             self.clock.tick(60)
+        self.delete_buffers()
         pygame.quit()
 
 if __name__ == "__main__":
-    CubeVisualizer().run()
+    parser = argparse.ArgumentParser(description="Interactive 3D transformation explorer")
+    parser.add_argument("--mesh", metavar="PATH", help="OBJ or PLY model to show instead of the cube")
+    CubeVisualizer(parser.parse_args().mesh).run()
@@ -0,0 +1,218 @@
+import json
+import os
+import sys
+import time
+import numpy as np
+
+# OBJ/PLY loading for the transformation explorer. Parsing text meshes is
+# slow, so the parsed arrays are cached next to the source file:
+#
+#   model.obj.vertices.npy   float32 (n, 3)
+#   model.obj.normals.npy    float32 (n, 3), per vertex
+#   model.obj.indices.npy    uint32 (m, 3), triangles
+#   model.obj.meta.json      source size and mtime, bounds
+#
+# Later loads of an unchanged source memory-map the .npy files, so even
+# meshes with millions of triangles open in milliseconds and the arrays can
+# go straight to glBufferData. Polygons are triangulated as fans, and
+# normals are always computed from the geometry (area-weighted face normals
+# summed per vertex), so OBJ texture/normal indices are ignored.
+
+CACHE_VERSION = 1
+ARRAYS = ("vertices", "normals", "indices")
+
+class Mesh:
+    def __init__(self, vertices, normals, indices, bounds=None):
+        self.vertices = vertices
+        self.normals = normals
+        self.indices = indices
+        if bounds is None:
+            bounds = (vertices.min(axis=0), vertices.max(axis=0)) if len(vertices) else (np.zeros(3), np.zeros(3))
+        self.bounds = (np.asarray(bounds[0], dtype=np.float64), np.asarray(bounds[1], dtype=np.float64))
+
+    @property
+    def center(self):
+        return (self.bounds[0] + self.bounds[1]) / 2
+
+    @property
+    def size(self):
+        return float(np.max(self.bounds[1] - self.bounds[0]))
+
+def load_mesh(path, cache=True):
+    # Parsed mesh from the cache when the source is unchanged, else parse and
+    # (re)write the cache
+    if cache:
+        mesh = _load_cache(path)
+        if mesh is not None:
+            return mesh
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".obj":
+        vertices, faces = parse_obj(path)
+    elif ext == ".ply":
+        vertices, faces = parse_ply(path)
+    else:
+        raise ValueError(f"unsupported mesh format: {path}")
+    indices = _triangulate(faces)
+    mesh = Mesh(vertices, vertex_normals(vertices, indices), indices)
+    if cache:
+        _save_cache(path, mesh)
+    return mesh
+
+def _source_key(path):
+    stat = os.stat(path)
+    return {"version": CACHE_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def _load_cache(path):
+    try:
+        with open(path + ".meta.json") as f:
+            meta = json.load(f)
+        if {k: meta.get(k) for k in ("version", "size", "mtime_ns")} != _source_key(path):
+            return None
+        arrays = [np.load(f"{path}.{name}.npy", mmap_mode="r") for name in ARRAYS]
+    except (OSError, ValueError):
+        return None
+    return Mesh(*arrays, bounds=meta["bounds"])
+
+def _save_cache(path, mesh):
+    # Arrays first and the metadata last, each written to a temporary name and
+    # renamed, so an interrupted write never leaves a cache that looks valid
+    try:
+        for name in ARRAYS:
+            tmp = f"{path}.{name}.tmp.npy"
+            np.save(tmp, getattr(mesh, name))
+            os.replace(tmp, f"{path}.{name}.npy")
+        meta = dict(_source_key(path), bounds=[b.tolist() for b in mesh.bounds])
+        with open(path + ".meta.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(path + ".meta.tmp", path + ".meta.json")
+    except OSError as e:
+        # A read-only directory only costs the next load a re-parse
+        print(f"Could not cache {path}: {e}")
+
+def parse_obj(path):
+    # Vertices ("v x y z", optionally followed by w or a colour, which can
+    # differ from line to line) and faces ("f a b c ...", each corner a 1-based
+    # or negative vertex index, optionally followed by /texcoord/normal)
+    vertex_tokens, faces = [], []
+    count = 0
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if line.startswith("v "):
+                xyz = line.split()[1:4]
+                if len(xyz) != 3:
+                    raise ValueError(f"{path}:{number}: vertex needs x, y and z")
+                vertex_tokens += xyz
+                count += 1
+            elif line.startswith("f "):
+                face = [int(corner.split("/", 1)[0]) for corner in line[2:].split()]
+                faces.append([i - 1 if i > 0 else count + i for i in face])
+    vertices = np.array(vertex_tokens, dtype=np.float32).reshape(count, 3)
+    return vertices, faces
+
+PLY_TYPES = {"char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1", "short": "i2", "int16": "i2",
+             "ushort": "u2", "uint16": "u2", "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+             "float": "f4", "float32": "f4", "double": "f8", "float64": "f8"}
+
+def parse_ply(path):
+    # ASCII and binary PLY: a "vertex" element with x, y, z and a "face"
+    # element with a vertex index list; other elements and properties are
+    # skipped
+    with open(path, "rb") as f:
+        if f.readline().strip() != b"ply":
+            raise ValueError(f"{path} is not a PLY file")
+        fmt, elements = None, []
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f"{path} ends before end_header")
+            words = line.decode("ascii").split()
+            if not words or words[0] in ("comment", "obj_info"):
+                continue
+            if words[0] == "format":
+                fmt = words[1]
+            elif words[0] == "element":
+                elements.append((words[1], int(words[2]), []))
+            elif words[0] == "property":
+                elements[-1][2].append(words[1:])
+            elif words[0] == "end_header":
+                break
+        if fmt == "ascii":
+            return _ply_ascii(f, elements)
+        return _ply_binary(f, elements, "<" if fmt == "binary_little_endian" else ">")
+
+def _ply_ascii(f, elements):
+    vertices, faces = np.zeros((0, 3), dtype=np.float32), []
+    for name, count, props in elements:
+        lines = [f.readline().decode("ascii") for _ in range(count)]
+        if name == "vertex":
+            names = [p[-1] for p in props]
+            table = np.array(" ".join(lines).split(), dtype=np.float64).reshape(count, len(props))
+            vertices = table[:, [names.index(a) for a in "xyz"]].astype(np.float32)
+        elif name == "face":
+            faces = [[int(v) for v in line.split()[1:int(line.split()[0]) + 1]] for line in lines]
+    return vertices, faces
+
+def _ply_binary(f, elements, order):
+    vertices, faces = np.zeros((0, 3), dtype=np.float32), []
+    for name, count, props in elements:
+        if all(p[0] != "list" for p in props):
+            dtype = np.dtype([(p[1], order + PLY_TYPES[p[0]]) for p in props])
+            table = _read(f, dtype, count)
+            if name == "vertex":
+                vertices = np.stack([table[a] for a in "xyz"], axis=1).astype(np.float32)
+            continue
+        if name != "face" or len(props) != 1:
+            raise ValueError(f"unsupported PLY element with lists: {name}")
+        _, length_type, index_type, _ = props[0]
+        length_dtype = np.dtype(order + PLY_TYPES[length_type])
+        index_dtype = np.dtype(order + PLY_TYPES[index_type])
+        # Fast path: every face a triangle, read as one fixed-size record. Mixed
+        # polygons or a short read (truncated file) go through the general loop.
+        start = f.tell()
+        tri = np.dtype([("n", length_dtype), ("v", index_dtype, 3)])
+        buf = f.read(tri.itemsize * count)
+        if len(buf) == tri.itemsize * count:
+            table = np.frombuffer(buf, dtype=tri)
+            if np.all(table["n"] == 3):
+                faces = table["v"].astype(np.uint32)
+                continue
+        f.seek(start)
+        faces = []
+        for _ in range(count):
+            n = int(_read(f, length_dtype, 1)[0])
+            faces.append(_read(f, index_dtype, n).tolist())
+    return vertices, faces
+
+def _read(f, dtype, count):
+    data = f.read(dtype.itemsize * count)
+    if len(data) != dtype.itemsize * count:
+        raise ValueError(f"PLY file {f.name} ends early")
+    return np.frombuffer(data, dtype=dtype)
+
+def _triangulate(faces):
+    # (m, 3) uint32 triangles from triangles already in an array, or from
+    # polygons of any size split into fans around their first corner
+    if isinstance(faces, np.ndarray):
+        return np.ascontiguousarray(faces, dtype=np.uint32)
+    triangles = [(face[0], face[k], face[k + 1]) for face in faces for k in range(1, len(face) - 1)]
+    return np.array(triangles, dtype=np.uint32).reshape(-1, 3)
+
+def vertex_normals(vertices, indices):
+    # Unit normal per vertex: the sum of the (area-weighted) normals of the
+    # triangles around it
+    corners = vertices[indices.astype(np.intp)]
+    face = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    normals = np.zeros(vertices.shape, dtype=np.float64)
+    for k in range(3):
+        for axis in range(3):
+            normals[:, axis] += np.bincount(indices[:, k], face[:, axis], minlength=len(vertices))
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    return (normals / np.where(length > 0, length, 1)).astype(np.float32)
+
+if __name__ == "__main__":
+    # python mesh_loader.py model.obj: parse (or load from cache) and time it
+    for path in sys.argv[1:]:
+        start = time.perf_counter()
+        mesh = load_mesh(path)
+        print(f"{path}: {len(mesh.vertices)} vertices, {len(mesh.indices)} triangles "
+              f"in {(time.perf_counter() - start) * 1000:.1f} ms")
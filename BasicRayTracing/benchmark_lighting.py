@@ -0,0 +1,68 @@
+import argparse
+import random
+import time
+
+from rayCasting import WIDTH, HEIGHT, calculate_lighting, generate_scene, load_scene
+from distance_field import DistanceField
+
+# Headless lighting benchmark: no window is opened, only the lighting pass
+# of rayCasting.py is timed. The analytic intersector path is quadratic in
+# the primitive count, so once it would exceed the test budget only a random
+# subset of objects is shaded and the full-frame time is extrapolated.
+ANALYTIC_BUDGET = 2e7  # ray-primitive tests per timed run
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_scene(label, light, objects, walls, repeat, seed):
+    print(f"\n{label}: {len(objects)} circles, {len(walls)} walls")
+
+    tests = len(objects) * light.penumbra_rays * (len(objects) + len(walls))
+    targets = None
+    if tests > ANALYTIC_BUDGET:
+        k = max(1, int(ANALYTIC_BUDGET // (light.penumbra_rays * (len(objects) + len(walls)))))
+        targets = random.Random(seed).sample(objects, k)
+    shaded = len(targets) if targets is not None else len(objects)
+    analytic = timed(lambda: calculate_lighting(light, objects, walls, targets=targets), repeat)
+    full = analytic * len(objects) / max(1, shaded)
+    note = "" if targets is None else f" (extrapolated from {shaded} objects)"
+    print(f"  analytic intersectors  {full * 1000:12.2f} ms/frame{note}")
+
+    field = DistanceField(WIDTH, HEIGHT)
+    build = timed(lambda: field.build(objects, walls), 1)
+    traced = timed(lambda: calculate_lighting(light, objects, walls, field), repeat)
+    print(f"  distance field build   {build * 1000:12.2f} ms")
+    print(f"  distance field trace   {traced * 1000:12.2f} ms/frame")
+    if objects:
+        print(f"  per object             {analytic / max(1, shaded) * 1e6:9.1f} us analytic, "
+              f"{traced / len(objects) * 1e6:9.1f} us traced")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time calculate_lighting without opening a window")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000],
+                        help="primitive counts for generated scenes")
+    parser.add_argument("--scene", help="benchmark a scene file (.json or .npz) instead")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.scene:
+        bench_scene(args.scene, *load_scene(args.scene), args.repeat, args.seed)
+        return
+    for size in args.sizes:
+        start = time.perf_counter()
+        scene = generate_scene(size, seed=args.seed)
+        print(f"\ngenerated {size} primitives in {(time.perf_counter() - start) * 1000:.1f} ms", end="")
+        bench_scene(f"{size} primitives", *scene, args.repeat, args.seed)
+
+
+if __name__ == "__main__":
+    main()
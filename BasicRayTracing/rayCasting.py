@@ -2,12 +2,11 @@ import pygame
 import numpy as np
 import math
 import random
+import json
+import sys
+from distance_field import DistanceField
 
-# Initialize Pygame
-pygame.init()
 WIDTH, HEIGHT = 800, 600
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Enhanced 2D Ray Casting with Soft Shadows")
 
 # Colors
 WHITE = (255, 255, 255)
@@ -55,23 +54,6 @@ class Wall:
         self.color = color
         self.thickness = 3
 
-# Scene Setup
-light = Light([WIDTH // 2, HEIGHT // 2])
-objects = [
-    CircleObject([300, 200], 50, RED),
-    CircleObject([500, 400], 70, GREEN),
-    CircleObject([200, 450], 40, BLUE),
-    CircleObject([400, 300], 60, (200, 200, 0))
-]
-
-walls = [
-    Wall([100, 100], [700, 100]),
-    Wall([700, 100], [700, 500]),
-    Wall([700, 500], [100, 500]),
-    Wall([100, 500], [100, 100]),
-    Wall([250, 150], [350, 250]),  # Additional diagonal wall
-]
-
 # Helper Functions
 def distance(p1, p2):
     return math.sqrt((p2[0]-p1[0])**2 + (p2[1]-p1[1])**2)
@@ -155,13 +137,54 @@ def get_normal(point, obj):
         # Rotate 90 degrees clockwise and normalize
         return (dy/length, -dx/length) if length > 0 else (0, 1)
 
-def calculate_lighting():
+def analytic_shadow(light, obj, light_dir, objects, walls):
+    # Shadow calculation (soft shadows)
+    visible = 0
+    total_samples = light.penumbra_rays
+    
+    # Jittered sampling for penumbra
+    for i in range(total_samples):
+        # Add small random offset to ray direction
+        angle = math.atan2(light_dir[1], light_dir[0])
+        angle += random.uniform(-0.1, 0.1)  # Small jitter
+        jittered_dir = (math.cos(angle), math.sin(angle))
+    
+        # Cast shadow ray
+        in_shadow = False
+    
+        # Check against other objects
+        for other in objects:
+            if other == obj:
+                continue
+            if ray_intersects_circle(light.pos, jittered_dir, other.pos, other.radius):
+                in_shadow = True
+                break
+    
+        # Check against walls
+        if not in_shadow:
+            for wall in walls:
+                if ray_intersects_line(light.pos, jittered_dir, wall.start, wall.end):
+                    in_shadow = True
+                    break
+    
+        if not in_shadow:
+            visible += 1
+    
+    return visible / total_samples
+
+def calculate_lighting(light, objects, walls, field=None, targets=None):
+    # Shade every object unless a subset of targets is given. With a baked
+    # distance field the shadow rays are sphere-traced instead of being
+    # tested against each primitive.
+    if targets is None:
+        targets = objects
+    
     # Reset object colors
-    for obj in objects:
+    for obj in targets:
         obj.color = obj.original_color
     
     # Calculate lighting for each object
-    for obj in objects:
+    for obj in targets:
         # Vector from light to object center
         light_dir = (obj.pos[0] - light.pos[0], obj.pos[1] - light.pos[1])
         dist = math.sqrt(light_dir[0]**2 + light_dir[1]**2)
@@ -176,39 +199,12 @@ def calculate_lighting():
         # Lambertian diffuse term (dot product)
         diffuse = max(0, light_dir[0] * normal[0] + light_dir[1] * normal[1])
         
-        # Shadow calculation (soft shadows)
-        visible = 0
-        total_samples = light.penumbra_rays
-        
-        # Jittered sampling for penumbra
-        for i in range(total_samples):
-            # Add small random offset to ray direction
-            angle = math.atan2(light_dir[1], light_dir[0])
-            angle += random.uniform(-0.1, 0.1)  # Small jitter
-            jittered_dir = (math.cos(angle), math.sin(angle))
-            
-            # Cast shadow ray
-            in_shadow = False
-            
-            # Check against other objects
-            for other in objects:
-                if other == obj:
-                    continue
-                if ray_intersects_circle(light.pos, jittered_dir, other.pos, other.radius):
-                    in_shadow = True
-                    break
-            
-            # Check against walls
-            if not in_shadow:
-                for wall in walls:
-                    if ray_intersects_line(light.pos, jittered_dir, wall.start, wall.end):
-                        in_shadow = True
-                        break
-            
-            if not in_shadow:
-                visible += 1
-        
-        shadow_factor = visible / total_samples
+        if field is not None:
+            # Trace from the lit side of the surface back towards the light
+            origin = (obj.pos[0] - light_dir[0] * obj.radius, obj.pos[1] - light_dir[1] * obj.radius)
+            shadow_factor = field.soft_shadow(origin, (-light_dir[0], -light_dir[1]), dist - obj.radius)
+        else:
+            shadow_factor = analytic_shadow(light, obj, light_dir, objects, walls)
         
         # Distance attenuation (light falls off with distance)
         attenuation = min(1, 100 / (dist**0.5))
@@ -217,61 +213,195 @@ def calculate_lighting():
         light_factor = AMBIENT + (diffuse * shadow_factor * attenuation * light.strength)
         obj.update_lighting(light_factor)
 
-# Main Game Loop
-running = True
-clock = pygame.time.Clock()
-dragging_obj = None
 
-while running:
-    # Handle events
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.MOUSEMOTION:
-            if pygame.mouse.get_pressed()[0]:  # Left mouse button
-                mouse_pos = pygame.mouse.get_pos()
-                if dragging_obj:
-                    dragging_obj.pos = list(mouse_pos)
-                else:
-                    light.move(mouse_pos)
-        elif event.type == pygame.MOUSEBUTTONDOWN:
-            mouse_pos = pygame.mouse.get_pos()
-            if event.button == 1:  # Left click
-                # Check if clicking on an object to drag it
-                for obj in objects:
-                    if distance(mouse_pos, obj.pos) < obj.radius:
-                        dragging_obj = obj
-                        break
-        elif event.type == pygame.MOUSEBUTTONUP:
-            if event.button == 1:  # Left click release
-                dragging_obj = None
+# Scene Setup
+def default_scene():
+    light = Light([WIDTH // 2, HEIGHT // 2])
+    objects = [
+        CircleObject([300, 200], 50, RED),
+        CircleObject([500, 400], 70, GREEN),
+        CircleObject([200, 450], 40, BLUE),
+        CircleObject([400, 300], 60, (200, 200, 0))
+    ]
+    
+    walls = [
+        Wall([100, 100], [700, 100]),
+        Wall([700, 100], [700, 500]),
+        Wall([700, 500], [100, 500]),
+        Wall([100, 500], [100, 100]),
+        Wall([250, 150], [350, 250]),  # Additional diagonal wall
+    ]
+    return light, objects, walls
+
+def generate_scene(count, width=WIDTH, height=HEIGHT, seed=0):
+    # Procedural scene with `count` primitives inside the bounding box walls:
+    # roughly four circles per random wall, sized to the available area
+    rng = random.Random(seed)
+    light = Light([width // 2, height // 2])
+    walls = [
+        Wall([10, 10], [width - 10, 10]),
+        Wall([width - 10, 10], [width - 10, height - 10]),
+        Wall([width - 10, height - 10], [10, height - 10]),
+        Wall([10, height - 10], [10, 10]),
+    ]
+    remaining = max(0, count - len(walls))
+    n_walls = remaining // 5
+    n_circles = remaining - n_walls
+    size = max(1.0, 0.25 * math.sqrt(width * height / max(1, remaining)))
     
-    # Clear screen
-    screen.fill(BLACK)
+    objects = []
+    for _ in range(n_circles):
+        radius = max(1, int(rng.uniform(0.5, 1.0) * size))
+        pos = [rng.uniform(20 + radius, width - 20 - radius), rng.uniform(20 + radius, height - 20 - radius)]
+        color = (rng.randint(60, 255), rng.randint(60, 255), rng.randint(60, 255))
+        objects.append(CircleObject(pos, radius, color))
+    for _ in range(n_walls):
+        start = [rng.uniform(20, width - 20), rng.uniform(20, height - 20)]
+        angle = rng.uniform(0, 2 * math.pi)
+        length = rng.uniform(1.0, 3.0) * size
+        end = [min(width - 20, max(20, start[0] + math.cos(angle) * length)),
+               min(height - 20, max(20, start[1] + math.sin(angle) * length))]
+        walls.append(Wall(start, end))
+    return light, objects, walls
+
+# Scene Files
+# .json is human-editable; .npz packs the same data as flat arrays:
+#   light   (6,)   x, y, radius, rays, penumbra_rays, strength
+#   circles (N, 6) x, y, radius, r, g, b
+#   walls   (M, 8) x0, y0, x1, y1, r, g, b, thickness
+def save_scene(path, light, objects, walls):
+    light_row = [light.pos[0], light.pos[1], light.radius, light.rays, light.penumbra_rays, light.strength]
+    if path.endswith(".npz"):
+        np.savez_compressed(
+            path,
+            light=np.array(light_row, dtype=np.float64),
+            circles=np.array([[*o.pos, o.radius, *o.original_color] for o in objects],
+                             dtype=np.float32).reshape(-1, 6),
+            walls=np.array([[*w.start, *w.end, *w.color, w.thickness] for w in walls],
+                           dtype=np.float32).reshape(-1, 8),
+        )
+        return
+    data = {
+        "light": dict(zip(("x", "y", "radius", "rays", "penumbra_rays", "strength"), light_row)),
+        "circles": [{"pos": list(o.pos), "radius": o.radius, "color": list(o.original_color)} for o in objects],
+        "walls": [{"start": list(w.start), "end": list(w.end), "color": list(w.color),
+                   "thickness": w.thickness} for w in walls],
+    }
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+def load_scene(path):
+    if path.endswith(".npz"):
+        data = np.load(path)
+        lx, ly, lr, rays, penumbra, strength = data["light"].tolist()
+        circles = [(row[:2], row[2], row[3:6]) for row in data["circles"].tolist()]
+        wall_rows = [(row[0:2], row[2:4], row[4:7], row[7]) for row in data["walls"].tolist()]
+    else:
+        with open(path) as f:
+            data = json.load(f)
+        l = data["light"]
+        lx, ly, lr, rays, penumbra, strength = (l["x"], l["y"], l["radius"], l["rays"],
+                                                l["penumbra_rays"], l["strength"])
+        circles = [(c["pos"], c["radius"], c["color"]) for c in data["circles"]]
+        wall_rows = [(w["start"], w["end"], w.get("color", GRAY), w.get("thickness", 3))
+                     for w in data["walls"]]
     
-    # Calculate lighting
-    calculate_lighting()
+    light = Light([lx, ly])
+    light.radius = int(lr)
+    light.rays = int(rays)
+    light.penumbra_rays = int(penumbra)
+    light.strength = strength
+    objects = [CircleObject(pos, int(radius), tuple(int(c) for c in color)) for pos, radius, color in circles]
+    walls = []
+    for start, end, color, thickness in wall_rows:
+        wall = Wall(start, end, tuple(int(c) for c in color))
+        wall.thickness = int(thickness)
+        walls.append(wall)
+    return light, objects, walls
+
+# Main Game Loop
+def main(scene_path=None):
+    # Initialize Pygame
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Enhanced 2D Ray Casting with Soft Shadows")
     
-    # Draw walls
-    for wall in walls:
-        pygame.draw.line(screen, wall.color, wall.start, wall.end, wall.thickness)
+    if scene_path:
+        light, objects, walls = load_scene(scene_path)
+    else:
+        light, objects, walls = default_scene()
     
-    # Draw objects with lighting
-    for obj in objects:
-        pygame.draw.circle(screen, obj.color, (int(obj.pos[0]), int(obj.pos[1])), obj.radius)
-        # Draw outline
-        pygame.draw.circle(screen, (50, 50, 50), (int(obj.pos[0]), int(obj.pos[1])), obj.radius, 1)
+    # Optional baked distance field for sphere-traced soft shadows (toggle with F)
+    distance_field = DistanceField(WIDTH, HEIGHT)
+    distance_field.build(objects, walls)
+    use_distance_field = False
     
-    # Draw light source
-    pygame.draw.circle(screen, LIGHT_COLOR, (int(light.pos[0]), int(light.pos[1])), light.radius)
-    pygame.draw.circle(screen, (200, 200, 100), (int(light.pos[0]), int(light.pos[1])), light.radius + 5, 1)
+    running = True
+    clock = pygame.time.Clock()
+    dragging_obj = None
     
-    # Display instructions
-    font = pygame.font.SysFont('Arial', 16)
-    text = font.render("Click and drag to move light. Click objects to move them.", True, WHITE)
-    screen.blit(text, (10, 10))
+    while running:
+        # Handle events
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.MOUSEMOTION:
+                if pygame.mouse.get_pressed()[0]:  # Left mouse button
+                    mouse_pos = pygame.mouse.get_pos()
+                    if dragging_obj:
+                        old_bounds = distance_field.primitive_bounds(dragging_obj)
+                        dragging_obj.pos = list(mouse_pos)
+                        distance_field.update(dragging_obj, old_bounds)
+                    else:
+                        light.move(mouse_pos)
+            elif event.type == pygame.MOUSEBUTTONDOWN:
+                mouse_pos = pygame.mouse.get_pos()
+                if event.button == 1:  # Left click
+                    # Check if clicking on an object to drag it
+                    for obj in objects:
+                        if distance(mouse_pos, obj.pos) < obj.radius:
+                            dragging_obj = obj
+                            break
+            elif event.type == pygame.MOUSEBUTTONUP:
+                if event.button == 1:  # Left click release
+                    dragging_obj = None
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_f:
+                    use_distance_field = not use_distance_field
+        
+        # Clear screen
+        screen.fill(BLACK)
+        
+        # Calculate lighting
+        calculate_lighting(light, objects, walls, distance_field if use_distance_field else None)
+        
+        # Draw walls
+        for wall in walls:
+            pygame.draw.line(screen, wall.color, wall.start, wall.end, wall.thickness)
+        
+        # Draw objects with lighting
+        for obj in objects:
+            pygame.draw.circle(screen, obj.color, (int(obj.pos[0]), int(obj.pos[1])), obj.radius)
+            # Draw outline
+            pygame.draw.circle(screen, (50, 50, 50), (int(obj.pos[0]), int(obj.pos[1])), obj.radius, 1)
+        
+        # Draw light source
+        pygame.draw.circle(screen, LIGHT_COLOR, (int(light.pos[0]), int(light.pos[1])), light.radius)
+        pygame.draw.circle(screen, (200, 200, 100), (int(light.pos[0]), int(light.pos[1])), light.radius + 5, 1)
+        
+        # Display instructions
+        font = pygame.font.SysFont('Arial', 16)
+        text = font.render("Click and drag to move light. Click objects to move them.", True, WHITE)
+        screen.blit(text, (10, 10))
+        mode = "distance field" if use_distance_field else "analytic"
+        text = font.render(f"F: toggle shadow mode ({mode})", True, WHITE)
+        screen.blit(text, (10, 30))
+        
+        pygame.display.flip()
+        clock.tick(60)
     
-    pygame.display.flip()
-    clock.tick(60)
+    pygame.quit()
 
-pygame.quit()
\ No newline at end of file
+if __name__ == "__main__":
+    # Optional scene file: python rayCasting.py scene.json
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -1,32 +1,534 @@
+import argparse
+import hashlib
+import os
+import time
 import numpy as np
 import matplotlib.pyplot as plt
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
 
-def ray_sphere_intersect(ray_origin, ray_dir, sphere_center, radius):
+AMBIENT = 0.1
+SUN_STRENGTH = 2.5  # Sun radiance for path tracing (the 1/pi of the BRDF folded in)
+SKY_TOP = np.array([0.5, 0.7, 1.0], dtype=np.float32)
+SKY_BOTTOM = np.array([1.0, 1.0, 1.0], dtype=np.float32)
+
+def camera_rays(width, height, y0=0, y1=None, x0=0, x1=None, jitter=None):
+    # One normalized ray per pixel of the [y0:y1, x0:x1] window, as an (H, W, 3) array.
+    # Image rows run downwards, so +y in camera space is the top of the frame.
+    # An optional (H, W, 2) jitter offsets each ray within its pixel as (dx, dy).
+    y1 = height if y1 is None else y1
+    x1 = width if x1 is None else x1
+    ray_dirs = np.empty((y1 - y0, x1 - x0, 3), dtype=np.float32)
+    ray_dirs[..., 0] = np.arange(x0, x1, dtype=np.float32)[None, :] - width / 2
+    ray_dirs[..., 1] = height / 2 - np.arange(y0, y1, dtype=np.float32)[:, None]
+    if jitter is not None:
+        ray_dirs[..., 0] += jitter[..., 0]
+        ray_dirs[..., 1] -= jitter[..., 1]
+    ray_dirs[..., 2] = -height
+    ray_dirs *= (1 / np.sqrt(np.einsum('...i,...i->...', ray_dirs, ray_dirs)))[..., None]
+    return ray_dirs
+
+def ray_sphere_intersect(ray_origin, ray_dirs, sphere_center, radius):
+    # Distance to the nearest hit in front of the origin for every ray, inf on a miss.
+    # Origins, directions, centers and radii all broadcast against each other.
     oc = ray_origin - sphere_center
-    a = np.dot(ray_dir, ray_dir)
-    b = 2.0 * np.dot(oc, ray_dir)
-    c = np.dot(oc, oc) - radius * radius
-    discriminant = b * b - 4 * a * c
-    return discriminant > 0  # True if ray hits sphere
+    a = np.einsum('...i,...i->...', ray_dirs, ray_dirs)
+    half_b = np.einsum('...i,...i->...', ray_dirs, oc)
+    c = np.einsum('...i,...i->...', oc, oc) - radius * radius
+    discriminant = half_b * half_b - a * c
+    hit = discriminant > 0
+    root = np.sqrt(np.maximum(discriminant, 0))
+    t = (-half_b - root) / a
+    t = np.where(t > 1e-4, t, (-half_b + root) / a)
+    t[~(hit & (t > 1e-4))] = np.inf
+    return t
+
+# Scene
+# A scene is three arrays: centers (N, 3), radii (N,), colors (N, 3), all float32
+def default_scene():
+    centers = np.array([[0, 0, -5]], dtype=np.float32)
+    return centers, np.array([1.0], dtype=np.float32), np.ones((1, 3), dtype=np.float32)
+
+def random_scene(count, seed=0):
+    # Spheres scattered over a ground plane (itself one huge sphere) in front of the camera
+    rng = np.random.default_rng(seed)
+    extent = max(10.0, np.sqrt(count) * 0.6)
+    centers = np.empty((count + 1, 3), dtype=np.float32)
+    radii = np.empty(count + 1, dtype=np.float32)
+    radii[:-1] = rng.uniform(0.1, 0.4, count)
+    centers[:-1, 0] = rng.uniform(-extent, extent, count)
+    centers[:-1, 1] = radii[:-1] - 1.5
+    centers[:-1, 2] = -rng.uniform(3, 2 * extent, count)
+    centers[-1] = (0, -1001.5, 0)
+    radii[-1] = 1000
+    colors = rng.uniform(0.2, 1.0, (count + 1, 3)).astype(np.float32)
+    colors[-1] = 0.6
+    return centers, radii, colors
+
+def save_scene(path, centers, radii, colors):
+    np.savez(path, centers=centers, radii=radii, colors=colors)
+
+def load_scene(path):
+    data = np.load(path)
+    return (data["centers"].astype(np.float32), data["radii"].astype(np.float32),
+            data["colors"].astype(np.float32))
+
+# BVH
+# Built once with binned SAH splits and stored as flat arrays. Node i is a leaf
+# when count[i] > 0 and covers order[start[i]:start[i] + count[i]]; otherwise its
+# children are left[i] and left[i] + 1, split along axis[i].
+def surface_area(lo, hi):
+    d = np.maximum(hi - lo, 0)
+    return 2 * (d[..., 0] * d[..., 1] + d[..., 1] * d[..., 2] + d[..., 2] * d[..., 0])
+
+def build_bvh(centers, radii, leaf_size=4, max_leaf=16, bins=16, traversal_cost=4.0):
+    # Built breadth-first: every node of one level is binned and split in the same
+    # vectorized pass, so the build costs O(depth) NumPy passes rather than one
+    # round of Python overhead per node
+    sphere_lo = centers - radii[:, None]
+    sphere_hi = centers + radii[:, None]
+    count_all = len(centers)
+    capacity = max(1, 2 * count_all - 1)
+    node_lo = np.zeros((capacity, 3), dtype=np.float32)
+    node_hi = np.zeros((capacity, 3), dtype=np.float32)
+    left = np.full(capacity, -1, dtype=np.int32)
+    start = np.zeros(capacity, dtype=np.int32)
+    count = np.zeros(capacity, dtype=np.int32)
+    axes = np.zeros(capacity, dtype=np.int8)
+    order = np.arange(count_all, dtype=np.int32)
+
+    seg_node = np.zeros(1, dtype=np.int64)
+    seg_start = np.zeros(1, dtype=np.int64)
+    seg_len = np.full(1, count_all, dtype=np.int64)
+    next_node = 1
+    while len(seg_node):
+        n_seg = len(seg_node)
+        offsets = np.cumsum(seg_len) - seg_len
+        seg_of = np.repeat(np.arange(n_seg), seg_len)
+        pos = np.arange(len(seg_of)) + (seg_start - offsets)[seg_of]
+        idx = order[pos]
+        lo, hi, cen = sphere_lo[idx], sphere_hi[idx], centers[idx]
+
+        box_lo = np.minimum.reduceat(lo, offsets)
+        box_hi = np.maximum.reduceat(hi, offsets)
+        node_lo[seg_node] = box_lo
+        node_hi[seg_node] = box_hi
+
+        # Bin centroids along all three axes of every node at once
+        cmin = np.minimum.reduceat(cen, offsets)
+        extent = np.maximum.reduceat(cen, offsets) - cmin
+        scale = np.where(extent > 0, bins / np.maximum(extent, 1e-30), 0)
+        bin_ids = np.minimum(((cen - cmin[seg_of]) * scale[seg_of]).astype(np.int64), bins - 1)
+        keys = ((seg_of[:, None] * 3 + np.arange(3)) * bins + bin_ids).ravel()
+        counts = np.bincount(keys, minlength=n_seg * 3 * bins).reshape(n_seg, 3, bins)
+        bin_lo = np.full((n_seg * 3 * bins, 3), np.inf, dtype=np.float32)
+        bin_hi = np.full((n_seg * 3 * bins, 3), -np.inf, dtype=np.float32)
+        np.minimum.at(bin_lo, keys, np.repeat(lo, 3, axis=0))
+        np.maximum.at(bin_hi, keys, np.repeat(hi, 3, axis=0))
+        bin_lo = bin_lo.reshape(n_seg, 3, bins, 3)
+        bin_hi = bin_hi.reshape(n_seg, 3, bins, 3)
+
+        # SAH cost of splitting after each bin
+        left_area = surface_area(np.minimum.accumulate(bin_lo, axis=2),
+                                 np.maximum.accumulate(bin_hi, axis=2))
+        right_area = surface_area(np.minimum.accumulate(bin_lo[:, :, ::-1], axis=2)[:, :, ::-1],
+                                  np.maximum.accumulate(bin_hi[:, :, ::-1], axis=2)[:, :, ::-1])
+        left_count = np.cumsum(counts, axis=2)[..., :-1]
+        n = seg_len[:, None, None]
+        with np.errstate(invalid='ignore'):
+            cost = left_area[..., :-1] * left_count + right_area[..., 1:] * (n - left_count)
+        cost[(left_count == 0) | (left_count == n)] = np.inf
+        cost = cost.reshape(n_seg, -1)
+        best = np.argmin(cost, axis=1)
+        best_cost = cost[np.arange(n_seg), best]
+        split_axis = best // (bins - 1)
+        split_bin = best % (bins - 1)
+
+        # Visiting a node costs more than one more sphere test in a packet tracer
+        area = surface_area(box_lo, box_hi)
+        splittable = np.isfinite(best_cost)
+        is_leaf = (seg_len <= leaf_size) | (
+            (~splittable | (best_cost + traversal_cost * area >= area * seg_len)) & (seg_len <= max_leaf))
+        start[seg_node[is_leaf]] = seg_start[is_leaf]
+        count[seg_node[is_leaf]] = seg_len[is_leaf]
+
+        split = ~is_leaf
+        if not split.any():
+            break
+        # Stable partition of each split node's range: left side first. Nodes whose
+        # centroids all coincide are split in half by index instead.
+        right = np.where(splittable[seg_of],
+                         bin_ids[np.arange(len(seg_of)), split_axis[seg_of]] > split_bin[seg_of],
+                         (pos - seg_start[seg_of]) >= seg_len[seg_of] // 2)
+        sel = split[seg_of]
+        perm = np.argsort(seg_of[sel] * 2 + right[sel], kind='stable')
+        order[pos[sel]] = idx[sel][perm]
+        n_left = np.bincount(seg_of[sel & ~right], minlength=n_seg)[split]
+
+        parents = seg_node[split]
+        children = next_node + 2 * np.arange(len(parents))
+        next_node += 2 * len(parents)
+        left[parents] = children
+        axes[parents] = split_axis[split]
+
+        starts = seg_start[split]
+        lens = seg_len[split]
+        seg_node = np.stack((children, children + 1), axis=1).ravel()
+        seg_start = np.stack((starts, starts + n_left), axis=1).ravel()
+        seg_len = np.stack((n_left, lens - n_left), axis=1).ravel()
+
+    return {
+        "lo": node_lo[:next_node],
+        "hi": node_hi[:next_node],
+        "left": left[:next_node],
+        "start": start[:next_node],
+        "count": count[:next_node],
+        "axis": axes[:next_node],
+        "order": order,
+    }
+
+def trace(bvh, centers, radii, origins, dirs, t_max=None, any_hit=False):
+    # Packet traversal: each visited node slab-tests the rays still alive in it.
+    # Returns (t, sphere index) per ray; with any_hit the search stops at the first
+    # blocker, which is all a shadow ray needs.
+    n_rays = len(dirs)
+    best_t = np.full(n_rays, np.inf, dtype=np.float32) if t_max is None else t_max.astype(np.float32)
+    best_id = np.full(n_rays, -1, dtype=np.int32)
+    with np.errstate(divide='ignore'):
+        inv_dirs = 1.0 / dirs
+    node_lo, node_hi = bvh["lo"], bvh["hi"]
+    left, start, count, axes, order = bvh["left"], bvh["start"], bvh["count"], bvh["axis"], bvh["order"]
+
+    stack = [(0, np.arange(n_rays))]
+    while stack:
+        node, rays = stack.pop()
+        o = origins[rays]
+        inv = inv_dirs[rays]
+        with np.errstate(invalid='ignore'):
+            t0 = (node_lo[node] - o) * inv
+            t1 = (node_hi[node] - o) * inv
+        t_near = np.maximum(np.nanmax(np.minimum(t0, t1), axis=1), 0)
+        t_far = np.nanmin(np.maximum(t0, t1), axis=1)
+        keep = (t_near <= t_far) & (t_near < best_t[rays])
+        rays = rays[keep]
+        if len(rays) == 0:
+            continue
+
+        if count[node] > 0:
+            spheres = order[start[node]:start[node] + count[node]]
+            t = ray_sphere_intersect(origins[rays][:, None, :], dirs[rays][:, None, :],
+                                     centers[spheres][None, :, :], radii[spheres][None, :])
+            nearest = np.argmin(t, axis=1)
+            t_hit = t[np.arange(len(rays)), nearest]
+            closer = t_hit < best_t[rays]
+            hit_rays = rays[closer]
+            best_id[hit_rays] = spheres[nearest[closer]]
+            # An occluded shadow ray gets best_t = 0 so no further box accepts it
+            best_t[hit_rays] = 0 if any_hit else t_hit[closer]
+            continue
+
+        # Visit the near child first so its hits can cull the far child
+        child = left[node]
+        if dirs[rays[0], axes[node]] < 0:
+            stack.append((child, rays))
+            stack.append((child + 1, rays))
+        else:
+            stack.append((child + 1, rays))
+            stack.append((child, rays))
+    return best_t, best_id
+
+# Rendering
+def sky_color(dirs):
+    # Vertical gradient seen by rays that hit nothing, in both render modes
+    sky = 0.5 * (dirs[:, 1:2] + 1)
+    return (1 - sky) * SKY_BOTTOM + sky * SKY_TOP
+
+def shade_tile(scene, bvh, light_dir, width, height, y0, y1, x0, x1):
+    centers, radii, colors = scene
+    dirs = camera_rays(width, height, y0, y1, x0, x1).reshape(-1, 3)
+    origins = np.zeros_like(dirs)
+    t, ids = trace(bvh, centers, radii, origins, dirs)
+    hit = ids >= 0
+
+    # Sky gradient where nothing is hit
+    pixels = sky_color(dirs)
+
+    points = origins[hit] + dirs[hit] * t[hit][:, None]
+    normals = (points - centers[ids[hit]]) / radii[ids[hit]][:, None]
+    diffuse = np.maximum(0, normals @ light_dir)
+
+    # Shadow rays towards the light from the lit points only
+    lit = diffuse > 0
+    shadow_origins = points[lit] + normals[lit] * 1e-3
+    shadow_dirs = np.broadcast_to(light_dir, shadow_origins.shape).copy()
+    _, blocker = trace(bvh, centers, radii, shadow_origins, shadow_dirs, any_hit=True)
+    visible = np.zeros(len(points), dtype=np.float32)
+    visible[lit] = blocker < 0
+
+    pixels[hit] = colors[ids[hit]] * (AMBIENT + (1 - AMBIENT) * (diffuse * visible))[:, None]
+    return pixels.reshape(y1 - y0, x1 - x0, 3)
+
+def tiles(width, height, size):
+    return [(y, min(y + size, height), x, min(x + size, width))
+            for y in range(0, height, size) for x in range(0, width, size)]
+
+def cosine_hemisphere(normals, rng):
+    # Cosine-weighted directions around each normal, using a branchless
+    # orthonormal basis built from the normal itself
+    nx, ny, nz = normals[:, 0], normals[:, 1], normals[:, 2]
+    sign = np.where(nz >= 0, 1.0, -1.0).astype(np.float32)
+    a = -1 / (sign + nz)
+    b = nx * ny * a
+    tangent = np.stack((1 + sign * nx * nx * a, sign * b, -sign * nx), axis=1)
+    bitangent = np.stack((b, sign + ny * ny * a, -ny), axis=1)
+    u1 = rng.random(len(normals), dtype=np.float32)
+    u2 = rng.random(len(normals), dtype=np.float32)
+    r = np.sqrt(u2)
+    phi = 2 * np.pi * u1
+    return ((r * np.cos(phi))[:, None] * tangent + (r * np.sin(phi))[:, None] * bitangent
+            + np.sqrt(1 - u2)[:, None] * normals)
+
+def path_trace_tile(scene, bvh, light_dir, width, height, y0, y1, x0, x1, rng, bounces):
+    # One jittered path per pixel: sky on escape, sun light through a shadow ray
+    # at every hit, then a cosine-weighted diffuse bounce
+    centers, radii, colors = scene
+    jitter = rng.random((y1 - y0, x1 - x0, 2), dtype=np.float32) - 0.5
+    dirs = camera_rays(width, height, y0, y1, x0, x1, jitter).reshape(-1, 3)
+    origins = np.zeros_like(dirs)
+    radiance = np.zeros_like(dirs)
+    throughput = np.ones_like(dirs)
+    alive = np.arange(len(dirs))
+
+    for _ in range(bounces + 1):
+        t, ids = trace(bvh, centers, radii, origins, dirs)
+        hit = ids >= 0
+        radiance[alive[~hit]] += throughput[~hit] * sky_color(dirs[~hit])
+
+        alive, ids, t = alive[hit], ids[hit], t[hit]
+        if len(alive) == 0:
+            break
+        points = origins[hit] + dirs[hit] * t[:, None]
+        normals = (points - centers[ids]) / radii[ids][:, None]
+        throughput = throughput[hit] * colors[ids]
+
+        cos_light = np.maximum(0, normals @ light_dir)
+        lit = cos_light > 0
+        shadow_origins = points[lit] + normals[lit] * 1e-3
+        _, blocker = trace(bvh, centers, radii, shadow_origins,
+                           np.broadcast_to(light_dir, shadow_origins.shape).copy(), any_hit=True)
+        visible = np.zeros(len(points), dtype=np.float32)
+        visible[lit] = blocker < 0
+        radiance[alive] += throughput * (SUN_STRENGTH * cos_light * visible)[:, None]
+
+        origins = points + normals * 1e-3
+        dirs = cosine_hemisphere(normals, rng).astype(np.float32)
+    return radiance.reshape(y1 - y0, x1 - x0, 3)
+
+_worker = {}
+
+def _init_worker(shm_name, shape, scene, bvh, light_dir, bounces=0, seed=0):
+    shm = SharedMemory(name=shm_name)
+    _worker.update(shm=shm, image=np.ndarray(shape, dtype=np.float32, buffer=shm.buf),
+                   scene=scene, bvh=bvh, light_dir=light_dir, bounces=bounces, seed=seed)
+
+def _render_tile(tile):
+    image = _worker["image"]
+    height, width = image.shape[:2]
+    y0, y1, x0, x1 = tile
+    image[y0:y1, x0:x1] = shade_tile(_worker["scene"], _worker["bvh"], _worker["light_dir"],
+                                     width, height, y0, y1, x0, x1)
+
+def render(scene, bvh, width, height, light_dir, tile=64, workers=None):
+    # Tiles are rendered by a process pool straight into a shared-memory image
+    workers = workers or os.cpu_count() or 1
+    shape = (height, width, 3)
+    shm = SharedMemory(create=True, size=int(np.prod(shape)) * 4)
+    try:
+        image = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        image.fill(0)
+        work = tiles(width, height, tile)
+        if workers == 1:
+            _init_worker(shm.name, shape, scene, bvh, light_dir)
+            for t in work:
+                _render_tile(t)
+            _worker["shm"].close()
+            _worker.clear()
+        else:
+            with Pool(workers, initializer=_init_worker,
+                      initargs=(shm.name, shape, scene, bvh, light_dir)) as pool:
+                for _ in pool.imap_unordered(_render_tile, work, chunksize=4):
+                    pass
+        result = image.copy()
+        del image
+    finally:
+        shm.close()
+        shm.unlink()
+    return result
+
+def _accumulate_tile(job):
+    # Tiles never overlap, so workers can add into the shared buffer directly.
+    # Seeding from (seed, sample, tile) keeps resumed runs reproducible.
+    tile_index, sample_index, (y0, y1, x0, x1) = job
+    accum = _worker["image"]
+    height, width = accum.shape[:2]
+    rng = np.random.default_rng([_worker["seed"], sample_index, tile_index])
+    accum[y0:y1, x0:x1] += path_trace_tile(_worker["scene"], _worker["bvh"], _worker["light_dir"],
+                                           width, height, y0, y1, x0, x1, rng, _worker["bounces"])
+
+def render_settings(scene, light_dir, bounces, seed):
+    # What the accumulated samples depend on besides the image size; a
+    # checkpoint only resumes under the same settings
+    digest = hashlib.sha1()
+    for array in (*scene, light_dir):
+        digest.update(np.ascontiguousarray(array, dtype=np.float32).tobytes())
+    return {"scene": digest.hexdigest(), "bounces": int(bounces), "seed": int(seed)}
+
+def save_checkpoint(path, accum, samples, settings):
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, accum=accum, samples=samples, **{f"setting_{k}": v for k, v in settings.items()})
+    os.replace(tmp, path)
+
+def load_checkpoint(path, shape, settings):
+    data = np.load(path)
+    if data["accum"].shape != shape:
+        raise ValueError(f"checkpoint {path} is {data['accum'].shape[1]}x{data['accum'].shape[0]}, "
+                         f"not {shape[1]}x{shape[0]}")
+    saved = {k: data[f"setting_{k}"].item() if f"setting_{k}" in data else None for k in settings}
+    changed = [f"{k} ({saved[k]} -> {settings[k]})" if k != "scene" else k
+               for k in settings if saved[k] != settings[k]]
+    if changed:
+        raise ValueError(f"checkpoint {path} was rendered with a different {', '.join(changed)}")
+    return data["accum"], int(data["samples"])
+
+def tonemap(accum, samples):
+    return np.clip(accum / max(samples, 1), 0, 1) ** (1 / 2.2)
+
+def progressive(scene, bvh, width, height, light_dir, max_samples=256, max_seconds=None, bounces=3,
+                tile=64, workers=None, checkpoint=None, resume=False, show=True, seed=0):
+    # Each pass adds one jittered sample per pixel into a float32 accumulation
+    # buffer; the running average is redisplayed in place until the sample or
+    # time budget runs out. The buffer and sample count can be checkpointed,
+    # along with the settings a resumed run must match.
+    workers = workers or os.cpu_count() or 1
+    shape = (height, width, 3)
+    shm = SharedMemory(create=True, size=int(np.prod(shape)) * 4)
+    pool = None
+    try:
+        accum = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        accum.fill(0)
+        samples = 0
+        settings = render_settings(scene, light_dir, bounces, seed)
+        if resume and checkpoint and os.path.exists(checkpoint):
+            accum[:], samples = load_checkpoint(checkpoint, shape, settings)
+            print(f"Resumed {checkpoint} at {samples} samples")
+
+        initargs = (shm.name, shape, scene, bvh, light_dir, bounces, seed)
+        if workers == 1:
+            _init_worker(*initargs)
+        else:
+            pool = Pool(workers, initializer=_init_worker, initargs=initargs)
+        work = tiles(width, height, tile)
+
+        if show:
+            plt.ion()
+            fig, ax = plt.subplots()
+            display = ax.imshow(tonemap(accum, samples))
+
+        start = time.perf_counter()
+        last_checkpoint = start
+        while samples < max_samples:
+            if max_seconds is not None and time.perf_counter() - start >= max_seconds:
+                break
+            jobs = [(i, samples, t) for i, t in enumerate(work)]
+            if pool is None:
+                for job in jobs:
+                    _accumulate_tile(job)
+            else:
+                pool.map(_accumulate_tile, jobs, chunksize=4)
+            samples += 1
+
+            if show:
+                if not plt.fignum_exists(fig.number):
+                    break
+                display.set_data(tonemap(accum, samples))
+                ax.set_title(f"{samples} samples, {time.perf_counter() - start:.1f} s")
+                plt.pause(0.001)
+            if checkpoint and time.perf_counter() - last_checkpoint > 10:
+                save_checkpoint(checkpoint, accum, samples, settings)
+                last_checkpoint = time.perf_counter()
+
+        if checkpoint:
+            save_checkpoint(checkpoint, accum, samples, settings)
+        result = tonemap(accum, samples)
+        del accum
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if _worker:
+            _worker["shm"].close()
+            _worker.clear()
+        shm.close()
+        shm.unlink()
+    if show:
+        plt.ioff()
+        plt.show()
+    return result, samples
 
 # Camera & Scene Setup
 width, height = 200, 200
-img = np.zeros((height, width, 3))
-sphere_pos = np.array([0, 0, -5])
-sphere_radius = 1.0
-light_dir = np.array([1, 1, -1]).astype(np.float32)
+light_dir = np.array([1, 1, 1]).astype(np.float32)
 light_dir /= np.linalg.norm(light_dir)
 
-# Ray Casting Loop
-for y in range(height):
-    for x in range(width):
-        ray_dir = np.array([x - width / 2, y - height / 2, -height]).astype(np.float32)
-        ray_dir /= np.linalg.norm(ray_dir)
-        if ray_sphere_intersect(np.array([0, 0, 0]), ray_dir, sphere_pos, sphere_radius):
-            normal = np.array([x - width / 2, y - height / 2, -height]) - sphere_pos
-            normal /= np.linalg.norm(normal)
-            diffuse = max(0, np.dot(normal, light_dir))
-            img[y, x] = [diffuse, diffuse, diffuse]  # Grayscale shading
-
-plt.imshow(img)
-plt.show()
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(description="Sphere ray tracer with a BVH and tile-parallel rendering")
+    parser.add_argument("--width", type=int, default=width)
+    parser.add_argument("--height", type=int, default=height)
+    parser.add_argument("--spheres", type=int, default=0, help="generate a random scene with this many spheres")
+    parser.add_argument("--scene", help="load spheres from an .npz scene file")
+    parser.add_argument("--save-scene", help="write the scene to an .npz file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tile", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-show", action="store_true")
+    parser.add_argument("--progressive", action="store_true",
+                        help="path trace progressively into an accumulation buffer")
+    parser.add_argument("--samples", type=int, default=256, help="progressive sample budget per pixel")
+    parser.add_argument("--time", type=float, default=None, help="progressive time budget in seconds")
+    parser.add_argument("--bounces", type=int, default=3)
+    parser.add_argument("--checkpoint", help="save the accumulation buffer here (.npz)")
+    parser.add_argument("--resume", action="store_true", help="continue from --checkpoint")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.scene:
+        scene = load_scene(args.scene)
+    elif args.spheres:
+        scene = random_scene(args.spheres, args.seed)
+    else:
+        scene = default_scene()
+    if args.save_scene:
+        save_scene(args.save_scene, *scene)
+    print(f"Scene: {len(scene[0])} spheres in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    bvh = build_bvh(scene[0], scene[1])
+    print(f"BVH: {len(bvh['left'])} nodes in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    if args.progressive:
+        _, samples = progressive(scene, bvh, args.width, args.height, light_dir, args.samples, args.time,
+                                 args.bounces, args.tile, args.workers, args.checkpoint, args.resume,
+                                 not args.no_show, args.seed)
+        print(f"Render: {samples} samples at {args.width}x{args.height} "
+              f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return
+    img = render(scene, bvh, args.width, args.height, light_dir, args.tile, args.workers)
+    print(f"Render: {args.width}x{args.height} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    if not args.no_show:
+        plt.imshow(np.clip(img, 0, 1))
+        plt.show()
+
+if __name__ == "__main__":
+    main()
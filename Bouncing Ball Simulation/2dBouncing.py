@@ -1,5 +1,7 @@
 import pygame
 import sys
+import math
+from fixed_step import FixedStepper, lerp
 
 # Initialize pygame
 pygame.init()
@@ -7,6 +9,7 @@ pygame.init()
 # Constants
 WIDTH, HEIGHT = 800, 600
 FPS = 60
+PHYSICS_RATE = 60  # Physics ticks per second, independent of FPS
 GRAVITY = 0.5
 ELASTICITY = 0.85
 FRICTION = 0.99
@@ -25,49 +28,61 @@ clock = pygame.time.Clock()
 ball_radius = 40
 ball_pos = [WIDTH // 4, HEIGHT // 4]
 ball_vel = [30, 0]  # Initial velocity (x, y)
+prev_pos = list(ball_pos)  # Position at the start of the current tick
+
+def step(dt):
+    # Apply gravity
+    ball_vel[1] += GRAVITY * dt
+    
+    # Update position
+    ball_pos[0] += ball_vel[0] * dt
+    ball_pos[1] += ball_vel[1] * dt
+    
+    # Collision with walls
+    if ball_pos[0] - ball_radius < 0:  # Left wall
+        ball_pos[0] = ball_radius
+        ball_vel[0] = -ball_vel[0] * ELASTICITY
+        ball_vel[1] *= FRICTION
+    elif ball_pos[0] + ball_radius > WIDTH:  # Right wall
+        ball_pos[0] = WIDTH - ball_radius
+        ball_vel[0] = -ball_vel[0] * ELASTICITY
+        ball_vel[1] *= FRICTION
+        
+    # Collision with floor/ceiling
+    if ball_pos[1] + ball_radius > HEIGHT:  # Floor
+        ball_pos[1] = HEIGHT - ball_radius
+        ball_vel[1] = -ball_vel[1] * ELASTICITY
+        ball_vel[0] *= FRICTION
+    elif ball_pos[1] - ball_radius < 0:  # Ceiling
+        ball_pos[1] = ball_radius
+        ball_vel[1] = -ball_vel[1] * ELASTICITY
+        ball_vel[0] *= FRICTION
+
+def save_previous():
+    prev_pos[:] = ball_pos
 
 def main():
     running = True
+    # Substep so the ball never moves more than half its radius at once
+    stepper = FixedStepper(step, PHYSICS_RATE, lambda: math.hypot(*ball_vel), ball_radius / 2,
+                           begin_tick=save_previous)
     while running:
+        frame_time = clock.tick(FPS) / 1000
+        
         # Handle events
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
         
         # Physics update
-        # Apply gravity
-        ball_vel[1] += GRAVITY
-        
-        # Update position
-        ball_pos[0] += ball_vel[0]
-        ball_pos[1] += ball_vel[1]
-        
-        # Collision with walls
-        if ball_pos[0] - ball_radius < 0:  # Left wall
-            ball_pos[0] = ball_radius
-            ball_vel[0] = -ball_vel[0] * ELASTICITY
-            ball_vel[1] *= FRICTION
-        elif ball_pos[0] + ball_radius > WIDTH:  # Right wall
-            ball_pos[0] = WIDTH - ball_radius
-            ball_vel[0] = -ball_vel[0] * ELASTICITY
-            ball_vel[1] *= FRICTION
-            
-        # Collision with floor/ceiling
-        if ball_pos[1] + ball_radius > HEIGHT:  # Floor
-            ball_pos[1] = HEIGHT - ball_radius
-            ball_vel[1] = -ball_vel[1] * ELASTICITY
-            ball_vel[0] *= FRICTION
-        elif ball_pos[1] - ball_radius < 0:  # Ceiling
-            ball_pos[1] = ball_radius
-            ball_vel[1] = -ball_vel[1] * ELASTICITY
-            ball_vel[0] *= FRICTION
+        alpha = stepper.advance(frame_time)
+        x, y = (lerp(p, c, alpha) for p, c in zip(prev_pos, ball_pos))
         
         # Drawing
         screen.fill(BLACK)
-        pygame.draw.circle(screen, RED, (int(ball_pos[0]), int(ball_pos[1])), ball_radius)
+        pygame.draw.circle(screen, RED, (int(x), int(y)), ball_radius)
         
         pygame.display.flip()
-        clock.tick(FPS)
     
     pygame.quit()
     sys.exit()
@@ -1,7 +1,12 @@
+import argparse
 import pygame
 import sys
-import random
-import math
+import numpy as np
+from ball_world import BallWorld, MATERIALS
+from ball_render import draw_trails, splat, SpriteCache, GlyphCache
+from fixed_step import FixedStepper
+from broad_phase import BROAD_PHASES
+from recording import Recorder
 
 # Initialize pygame
 pygame.init()
@@ -9,138 +14,101 @@ pygame.init()
 # Constants
 WIDTH, HEIGHT = 800, 600
 FPS = 60
+PHYSICS_RATE = 60  # Physics ticks per second, independent of FPS
 GRAVITY = 0.5
 BACKGROUND_COLOR = (0, 0, 0)
-
-# Ball materials with different properties
-MATERIALS = {
-    "rubber": {"elasticity": 0.8, "friction": 0.99, "color": (255, 0, 0)},
-    "glass": {"elasticity": 0.95, "friction": 0.998, "color": (0, 100, 255)},
-    "steel": {"elasticity": 0.7, "friction": 0.95, "color": (200, 200, 200)},
-    "wood": {"elasticity": 0.6, "friction": 0.9, "color": (139, 69, 19)}
-}
+MAX_TRAJECTORY = 50
+LABEL_LIMIT = 100  # Material labels are only drawn for small scenes
+TRAIL_LIMIT = 1100  # Trails are drawn for up to one batch of B (about 20 ms a frame)
+BATCH_SIZE = 1000  # Balls added per press of B
+SMALL_RADIUS = (2, 5)
 
 # Set up display
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Bouncing Ball Simulation")
 clock = pygame.time.Clock()
 font = pygame.font.SysFont('Arial', 16)
+trail_layer = pygame.Surface((WIDTH, HEIGHT))
+glyphs = GlyphCache(font)
+
+def add_ball(world, x, y, material="rubber", vx=None, vy=None):
+    rng = world.rng
+    if vx is None:
+        vx = rng.uniform(-5, 5)
+    if vy is None:
+        vy = rng.uniform(-5, 0)
+    world.add([x, y], [vx, vy], rng.integers(15, 31), material)
+
+def add_random_balls(world, count, radius_range=(15, 30), margin=50):
+    # Bulk spawn with random materials anywhere inside the margins
+    rng = world.rng
+    pos = rng.uniform([margin, margin], [WIDTH - margin, HEIGHT - margin], (count, 2))
+    vel = rng.uniform([-5, -5], [5, 0], (count, 2))
+    radius = rng.integers(radius_range[0], radius_range[1] + 1, count)
+    world.add(pos, vel, radius, rng.integers(0, len(MATERIALS), count))
+
+def draw_world(surface, world, sprites, alpha=1.0, splats=False):
+    pos, vel, radius, material = world.state()
+    pos = world.interpolated(alpha).astype(int)
+    radius = radius.astype(int)
+    color = world.color[:world.count]
+
+    # Draw trajectories from the trail ring buffer
+    if world.count <= TRAIL_LIMIT:
+        points, filled = world.trails.ordered(world.count)
+        draw_trails(surface, trail_layer, points, filled, color)
 
-class Ball:
-    def __init__(self, x, y, material="rubber"):
-        self.radius = random.randint(15, 30)
-        self.x = x
-        self.y = y
-        self.vx = random.uniform(-5, 5)
-        self.vy = random.uniform(-5, 0)
-        self.material = material
-        self.trajectory = []
-        self.max_trajectory = 50
-        
-    @property
-    def elasticity(self):
-        return MATERIALS[self.material]["elasticity"]
-    
-    @property
-    def friction(self):
-        return MATERIALS[self.material]["friction"]
-    
-    @property
-    def color(self):
-        return MATERIALS[self.material]["color"]
-    
-    def update(self):
-        # Apply gravity
-        self.vy += GRAVITY
-        
-        # Update position
-        self.x += self.vx
-        self.y += self.vy
-        
-        # Record trajectory (for drawing)
-        self.trajectory.append((self.x, self.y))
-        if len(self.trajectory) > self.max_trajectory:
-            self.trajectory.pop(0)
-        
-        # Collision with walls
-        if self.x - self.radius < 0:  # Left wall
-            self.x = self.radius
-            self.vx = -self.vx * self.elasticity
-            self.vy *= self.friction
-        elif self.x + self.radius > WIDTH:  # Right wall
-            self.x = WIDTH - self.radius
-            self.vx = -self.vx * self.elasticity
-            self.vy *= self.friction
-            
-        # Collision with floor/ceiling
-        if self.y + self.radius > HEIGHT:  # Floor
-            self.y = HEIGHT - self.radius
-            self.vy = -self.vy * self.elasticity
-            self.vx *= self.friction
-        elif self.y - self.radius < 0:  # Ceiling
-            self.y = self.radius
-            self.vy = -self.vy * self.elasticity
-            self.vx *= self.friction
-    
-    def draw(self, surface):
-        # Draw trajectory
-        if len(self.trajectory) > 1:
-            pygame.draw.lines(surface, (*self.color, 50), False, self.trajectory, 2)
-        
-        # Draw ball
-        pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), self.radius)
-        
-        # Draw material label
-        text = font.render(self.material, True, (255, 255, 255))
-        surface.blit(text, (int(self.x) - text.get_width() // 2, int(self.y) - self.radius - 20))
-
-def check_collision(ball1, ball2):
-    dx = ball1.x - ball2.x
-    dy = ball1.y - ball2.y
-    distance = math.sqrt(dx*dx + dy*dy)
-    
-    if distance < ball1.radius + ball2.radius:
-        # Calculate collision response (simplified)
-        angle = math.atan2(dy, dx)
-        
-        # Move balls apart
-        overlap = (ball1.radius + ball2.radius - distance) / 2
-        ball1.x += overlap * math.cos(angle)
-        ball1.y += overlap * math.sin(angle)
-        ball2.x -= overlap * math.cos(angle)
-        ball2.y -= overlap * math.sin(angle)
-        
-        # Calculate velocities
-        total_elasticity = (ball1.elasticity + ball2.elasticity) / 2
-        total_friction = (ball1.friction + ball2.friction) / 2
-        
-        # Exchange velocities (simplified physics)
-        ball1.vx, ball2.vx = ball2.vx * total_elasticity, ball1.vx * total_elasticity
-        ball1.vy, ball2.vy = ball2.vy * total_elasticity, ball1.vy * total_elasticity
-        
-        # Apply friction
-        ball1.vx *= total_friction
-        ball1.vy *= total_friction
-        ball2.vx *= total_friction
-        ball2.vy *= total_friction
+    # Draw balls from the sprite cache, or splat them all into the pixels
+    if splats:
+        splat(surface, pos, radius, color)
+    else:
+        sprites.draw(surface, pos, radius, material)
+
+    # Draw material labels
+    if world.count <= LABEL_LIMIT:
+        names = world.materials.names
+        labels = []
+        for (x, y), r, m in zip(pos.tolist(), radius.tolist(), material.tolist()):
+            text = glyphs.get(names[m])
+            labels.append((text, (x - text.get_width() // 2, y - r - 20)))
+        surface.blits(labels, doreturn=False)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bouncing balls with materials")
+    parser.add_argument("--seed", type=int, default=None, help="seed for a repeatable run")
+    parser.add_argument("--record", metavar="PATH", help="record every tick to PATH (play back with replay.py)")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
     running = True
-    balls = []
+    world = BallWorld((0, 0), (WIDTH, HEIGHT), (0, GRAVITY), seed=args.seed, trail_length=MAX_TRAJECTORY)
+    world.sleeping = True
+    # Sweep fast throws instead of substepping them
+    world.ccd = True
+    sprites = SpriteCache(world.materials.color)
+    splats = False
     dragging = False
     drag_start = (0, 0)
     selected_material = "rubber"
-    
+
     # Create some initial balls
-    for _ in range(3):
-        material = random.choice(list(MATERIALS.keys()))
-        balls.append(Ball(
-            random.randint(100, WIDTH-100),
-            random.randint(100, HEIGHT-100),
-            material
-        ))
-    
+    add_random_balls(world, 3, margin=100)
+
+    # The state at the start of every tick goes to the recording
+    recorder = Recorder(args.record, world, PHYSICS_RATE, args.seed) if args.record else None
+
+    def begin_tick():
+        if recorder is not None:
+            recorder.append(world)
+        world.begin_tick()
+
+    # Without CCD, substep so no ball moves more than half the smallest radius at once
+    stepper = FixedStepper(world.step, PHYSICS_RATE, world.max_speed, world.max_travel,
+                           begin_tick=begin_tick)
+
     while running:
+        frame_time = clock.tick(FPS) / 1000
         # Handle events
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -161,60 +129,68 @@ def main():
                     # Create new ball with velocity based on drag
                     vx = (drag_start[0] - end_pos[0]) / 10
                     vy = (drag_start[1] - end_pos[1]) / 10
-                    new_ball = Ball(drag_start[0], drag_start[1], selected_material)
-                    new_ball.vx = vx
-                    new_ball.vy = vy
-                    balls.append(new_ball)
+                    add_ball(world, drag_start[0], drag_start[1], selected_material, vx, vy)
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_SPACE:
                     # Add a random ball on space
-                    material = random.choice(list(MATERIALS.keys()))
-                    balls.append(Ball(
-                        random.randint(50, WIDTH-50),
-                        random.randint(50, HEIGHT-50),
-                        material
-                    ))
+                    add_random_balls(world, 1)
+                elif event.key == pygame.K_b:
+                    # Add a batch of small balls
+                    add_random_balls(world, BATCH_SIZE, SMALL_RADIUS, margin=10)
+                elif event.key == pygame.K_x:
+                    world.collisions = not world.collisions
+                elif event.key == pygame.K_s:
+                    # Toggle sleeping of settled balls
+                    world.sleeping = not world.sleeping
+                    world.wake(np.arange(world.count))
+                elif event.key == pygame.K_k:
+                    # Toggle continuous collision detection
+                    world.ccd = not world.ccd
+                elif event.key == pygame.K_r:
+                    # Toggle between sprites and pixel splats
+                    splats = not splats
+                elif event.key == pygame.K_p:
+                    # Cycle the collision broad phase
+                    phases = list(BROAD_PHASES)
+                    world.broad_phase = phases[(phases.index(world.broad_phase) + 1) % len(phases)]
                 elif event.key == pygame.K_c:
                     # Clear all balls
-                    balls = []
-        
-        # Physics update
-        for ball in balls:
-            ball.update()
-        
-        # Ball-ball collisions
-        for i in range(len(balls)):
-            for j in range(i+1, len(balls)):
-                check_collision(balls[i], balls[j])
-        
+                    world.clear()
+
+        # Physics update (gravity, integration, walls and ball-ball collisions)
+        alpha = stepper.advance(frame_time)
+
         # Drawing
         screen.fill(BACKGROUND_COLOR)
-        
+
         # Draw instructions
         instructions = [
             "Left click and drag to throw a ball",
             "Right click to change material",
-            "Space to add random ball",
-            "C to clear all balls",
-            f"Current material: {selected_material}"
+            "Space to add random ball, B to add 1000",
+            "X to toggle ball collisions, P to change broad phase, S to toggle sleeping",
+            "K to toggle continuous collisions, R to toggle pixel splats, C to clear all balls",
+            f"Current material: {selected_material}",
+            f"Balls: {world.count}  Asleep: {int(world.asleep[:world.count].sum())}  "
+            f"Broad phase: {world.broad_phase}  CCD: {'on' if world.ccd else 'off'}  "
+            f"Renderer: {'splats' if splats else 'sprites'}  FPS: {clock.get_fps():.0f}"
         ]
-        for i, text in enumerate(instructions):
-            text_surface = font.render(text, True, (255, 255, 255))
-            screen.blit(text_surface, (10, 10 + i * 20))
-        
+        screen.blits([(glyphs.get(text), (10, 10 + i * 20)) for i, text in enumerate(instructions)],
+                     doreturn=False)
+
         # Draw drag line if dragging
         if dragging:
             pygame.draw.line(screen, (255, 255, 255), drag_start, pygame.mouse.get_pos(), 2)
-        
+
         # Draw balls
-        for ball in balls:
-            ball.draw(screen)
-        
+        draw_world(screen, world, sprites, alpha, splats)
+
         pygame.display.flip()
-        clock.tick(FPS)
-    
+
+    if recorder is not None:
+        recorder.close()
     pygame.quit()
     sys.exit()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
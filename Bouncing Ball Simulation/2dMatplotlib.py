@@ -1,63 +1,129 @@
+import argparse
+import multiprocessing as mp
+import os
+import time
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
-from matplotlib.patches import Circle
+from matplotlib.collections import EllipseCollection
+from ball_world import BallWorld
+from fixed_step import FixedStepper
 
 # Constants
 WIDTH, HEIGHT = 10, 10
 GRAVITY = 0.1
 ELASTICITY = 0.8
 FRICTION = 0.99
+INTERVAL = 20  # Milliseconds between animation frames
+PHYSICS_RATE = 1000 / INTERVAL  # Physics ticks per second, independent of redraw speed
+SMALL_RADIUS = (0.05, 0.1)  # Radius range of the extra balls from --balls
+FRAME_CHUNK = 25  # Frames handed to an export worker at a time
 
-# Initial conditions
-ball_pos = np.array([2.0, 8.0])
-ball_vel = np.array([0.5, 0.0])
-ball_radius = 0.5
-
-# Set up figure
-fig, ax = plt.subplots(figsize=(8, 8))
-ax.set_xlim(0, WIDTH)
-ax.set_ylim(0, HEIGHT)
-ax.set_aspect('equal')
-ax.grid(True)
-
-# Create ball
-ball = Circle((ball_pos[0], ball_pos[1]), ball_radius, fc='r')
-ax.add_patch(ball)
-
-def update(frame):
-    global ball_pos, ball_vel
-    
-    # Apply gravity
-    ball_vel[1] -= GRAVITY
-    
-    # Update position
-    ball_pos += ball_vel
-    
-    # Collision detection
-    if ball_pos[0] - ball_radius < 0:
-        ball_pos[0] = ball_radius
-        ball_vel[0] = -ball_vel[0] * ELASTICITY
-        ball_vel[1] *= FRICTION
-    elif ball_pos[0] + ball_radius > WIDTH:
-        ball_pos[0] = WIDTH - ball_radius
-        ball_vel[0] = -ball_vel[0] * ELASTICITY
-        ball_vel[1] *= FRICTION
-        
-    if ball_pos[1] - ball_radius < 0:
-        ball_pos[1] = ball_radius
-        ball_vel[1] = -ball_vel[1] * ELASTICITY
-        ball_vel[0] *= FRICTION
-    elif ball_pos[1] + ball_radius > HEIGHT:
-        ball_pos[1] = HEIGHT - ball_radius
-        ball_vel[1] = -ball_vel[1] * ELASTICITY
-        ball_vel[0] *= FRICTION
-    
-    # Update ball position
-    ball.center = (ball_pos[0], ball_pos[1])
-    
-    return ball,
-
-ani = animation.FuncAnimation(fig, update, frames=range(1000), 
-                              interval=20, blit=True)
-plt.show()
\ No newline at end of file
+MATERIALS = {
+    "default": {"elasticity": ELASTICITY, "friction": FRICTION, "color": (255, 0, 0)}
+}
+
+def make_world(count=1, seed=None):
+    # The original ball, plus count - 1 small random ones
+    world = BallWorld((0, 0), (WIDTH, HEIGHT), (0, -GRAVITY), MATERIALS, capacity=count, seed=seed)
+    world.add([2.0, 8.0], [0.5, 0.0], 0.5, 0)
+    extra = count - 1
+    if extra > 0:
+        rng = world.rng
+        radius = rng.uniform(*SMALL_RADIUS, extra)
+        pos = rng.uniform(radius[:, None], (WIDTH - radius[:, None], HEIGHT - radius[:, None]))
+        world.add(pos, rng.uniform(-0.5, 0.5, (extra, 2)), radius, 0, rng.integers(80, 256, (extra, 3)))
+    world.begin_tick()
+    return world
+
+def make_stepper(world):
+    # Substep so no ball moves more than half its radius at once
+    return FixedStepper(world.step, PHYSICS_RATE, world.max_speed, world.max_travel,
+                        begin_tick=world.begin_tick)
+
+def make_figure(radius, color):
+    # Every ball is one ellipse of one collection; animation only moves its offsets
+    fig, ax = plt.subplots(figsize=(8, 8))
+    ax.set_xlim(0, WIDTH)
+    ax.set_ylim(0, HEIGHT)
+    ax.set_aspect('equal')
+    ax.grid(True)
+    balls = EllipseCollection(2 * radius, 2 * radius, 0, units='xy', offsets=np.zeros((len(radius), 2)),
+                              offset_transform=ax.transData, facecolors=color / 255)
+    ax.add_collection(balls)
+    return fig, balls
+
+def animate(world):
+    n = world.count
+    fig, balls = make_figure(world.radius[:n], world.color[:n])
+    stepper = make_stepper(world)
+    last_time = time.perf_counter()
+
+    def update(frame):
+        nonlocal last_time
+        now = time.perf_counter()
+        alpha = stepper.advance(now - last_time)
+        last_time = now
+
+        # Update ball positions in place
+        balls.set_offsets(world.interpolated(alpha))
+        return balls,
+
+    ani = animation.FuncAnimation(fig, update, frames=range(1000),
+                                  interval=INTERVAL, blit=True)
+    plt.show()
+    return ani
+
+# Export: the main process simulates one tick per frame (the simulation is
+# sequential), and a pool of processes renders the frames. Each worker builds
+# the figure once and then only moves the offsets and saves.
+_export = {}
+
+def _init_export(radius, color, directory):
+    plt.switch_backend("Agg")
+    fig, balls = make_figure(radius, color)
+    _export.update(fig=fig, balls=balls, directory=directory)
+
+def _render_frames(chunk):
+    first, frames = chunk
+    for k, pos in enumerate(frames):
+        _export["balls"].set_offsets(pos)
+        _export["fig"].savefig(os.path.join(_export["directory"], f"frame_{first + k:05d}.png"))
+    return len(frames)
+
+def export(world, frames, directory, workers=None):
+    os.makedirs(directory, exist_ok=True)
+    n = world.count
+    stepper = make_stepper(world)
+    workers = workers or os.cpu_count()
+    start = time.perf_counter()
+    with mp.Pool(workers, _init_export, (world.radius[:n], world.color[:n], directory)) as pool:
+        pending = []
+        for first in range(0, frames, FRAME_CHUNK):
+            chunk = []
+            for _ in range(min(FRAME_CHUNK, frames - first)):
+                chunk.append(world.pos[:n].copy())
+                stepper.advance(stepper.tick_time)
+            pending.append(pool.apply_async(_render_frames, ((first, chunk),)))
+        written = sum(p.get() for p in pending)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {written} frames of {n} balls to {directory} in {elapsed:.1f}s "
+          f"({written / elapsed:.1f} frames/s, {workers} workers)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Bouncing balls drawn with matplotlib")
+    parser.add_argument("--balls", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--export", metavar="DIR", help="render frames to DIR as PNGs instead of animating")
+    parser.add_argument("--frames", type=int, default=500, help="frames to export")
+    parser.add_argument("--workers", type=int, default=None, help="export processes")
+    args = parser.parse_args()
+
+    world = make_world(args.balls, args.seed)
+    if args.export:
+        export(world, args.frames, args.export, args.workers)
+    else:
+        animate(world)
+
+if __name__ == "__main__":
+    main()
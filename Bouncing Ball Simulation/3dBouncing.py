@@ -1,119 +1,134 @@
+import argparse
 import pygame
 import sys
-import random
-import math
+import numpy as np
 from pygame.locals import *
+from ball_world import BallWorld
+from ball_render import draw_trails
+from camera import Camera, PickGrid
+from fixed_step import FixedStepper
+from recording import Recorder
 
 pygame.init()
 
 # Constants
 WIDTH, HEIGHT = 800, 600
 FPS = 60
+PHYSICS_RATE = 60  # Physics ticks per second, independent of FPS
 GRAVITY = 0.5
 BOX_SIZE = 300
 VIEW_DISTANCE = 800
 BACKGROUND_COLOR = (0, 0, 0)
 WHITE = (255, 255, 255)
+MAX_TRAJECTORY = 20
+TRAIL_LIMIT = 1100  # Trails are drawn for up to one batch of B (about 20 ms a frame)
+BATCH_SIZE = 1000  # Balls added per press of B
+SMALL_RADIUS = (3, 6)
+
+# Balls bounce off the box walls at 80% speed with no friction
+MATERIALS = {
+    "default": {"elasticity": 0.8, "friction": 1.0, "color": WHITE}
+}
 
 # Display
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("3D Ball Simulation with Mouse Interaction")
 clock = pygame.time.Clock()
 font = pygame.font.SysFont('Arial', 16)
+trail_layer = pygame.Surface((WIDTH, HEIGHT))
+
+# Orbit camera; its view-projection matrix is rebuilt once per frame
+camera = Camera(WIDTH, HEIGHT, VIEW_DISTANCE)
+# The balls' circles as last drawn, for mouse picking
+picks = PickGrid(WIDTH, HEIGHT)
 
-# Global camera angles
-angle_x, angle_y = 0, 0
-
-def rotate_point(x, y, z, ax, ay):
-    # X-axis rotation
-    cosx, sinx = math.cos(ax), math.sin(ax)
-    y, z = y * cosx - z * sinx, y * sinx + z * cosx
-    # Y-axis rotation
-    cosy, siny = math.cos(ay), math.sin(ay)
-    x, z = x * cosy - z * siny, x * siny + z * cosy
-    return x, y, z
-
-class Ball3D:
-    def __init__(self):
-        self.radius = random.randint(20, 30)
-        self.x = random.randint(-BOX_SIZE//2, BOX_SIZE//2)
-        self.y = random.randint(-BOX_SIZE//2, BOX_SIZE//2)
-        self.z = random.randint(-BOX_SIZE//2, BOX_SIZE//2)
-        self.vx = random.uniform(-3, 3)
-        self.vy = random.uniform(-3, 3)
-        self.vz = random.uniform(-3, 3)
-        self.color = (random.randint(80, 255), random.randint(80, 255), random.randint(80, 255))
-        self.trajectory = []
-        self.max_trajectory = 20
-        self.dragged = False
-
-    def update(self):
-        if not self.dragged:
-            self.vy -= GRAVITY
-            self.x += self.vx
-            self.y += self.vy
-            self.z += self.vz
-
-        self.trajectory.append((self.x, self.y, self.z))
-        if len(self.trajectory) > self.max_trajectory:
-            self.trajectory.pop(0)
-
-        r = self.radius
-        for axis, vel_attr in [('x', 'vx'), ('y', 'vy'), ('z', 'vz')]:
-            val = getattr(self, axis)
-            vel = getattr(self, vel_attr)
-            if val - r < -BOX_SIZE//2:
-                setattr(self, axis, -BOX_SIZE//2 + r)
-                setattr(self, vel_attr, -vel * 0.8)
-            elif val + r > BOX_SIZE//2:
-                setattr(self, axis, BOX_SIZE//2 - r)
-                setattr(self, vel_attr, -vel * 0.8)
-
-    def project_3d_to_2d(self, x, y, z):
-        x, y, z = rotate_point(x, y, z, angle_x, angle_y)
-        factor = VIEW_DISTANCE / (VIEW_DISTANCE + z)
-        x2d = x * factor + WIDTH // 2
-        y2d = -y * factor + HEIGHT // 2
-        r2d = self.radius * factor
-        return x2d, y2d, r2d
-
-    def draw(self, surface):
-        if len(self.trajectory) > 1:
-            points = [self.project_3d_to_2d(*pt)[:2] for pt in self.trajectory]
-            pygame.draw.lines(surface, (*self.color, 100), False, points, 2)
-
-        x2d, y2d, r2d = self.project_3d_to_2d(self.x, self.y, self.z)
-        pygame.draw.circle(surface, self.color, (int(x2d), int(y2d)), int(r2d))
-        depth_color = tuple(min(255, c + 50) for c in self.color)
-        pygame.draw.circle(surface, depth_color, (int(x2d), int(y2d)), int(r2d * 0.3))
-
-    def is_mouse_over(self, mx, my):
-        x2d, y2d, r2d = self.project_3d_to_2d(self.x, self.y, self.z)
-        dist = math.hypot(mx - x2d, my - y2d)
-        return dist < r2d
-
-def draw_3d_box():
-    corners = [(-1, -1, -1), (1, -1, -1), (1, 1, -1), (-1, 1, -1),
-               (-1, -1, 1), (1, -1, 1), (1, 1, 1), (-1, 1, 1)]
-    corners = [(x * BOX_SIZE//2, y * BOX_SIZE//2, z * BOX_SIZE//2) for x, y, z in corners]
-    projected = [Ball3D().project_3d_to_2d(*rotate_point(x, y, z, angle_x, angle_y))[:2] for (x, y, z) in corners]
-
-    edges = [(0, 1), (1, 2), (2, 3), (3, 0),
+# Box corners and the edges between them
+BOX_CORNERS = np.array([(x, y, z) for z in (-1, 1) for x, y in ((-1, -1), (1, -1), (1, 1), (-1, 1))],
+                       dtype=np.float64) * (BOX_SIZE // 2)
+BOX_EDGES = [(0, 1), (1, 2), (2, 3), (3, 0),
              (4, 5), (5, 6), (6, 7), (7, 4),
              (0, 4), (1, 5), (2, 6), (3, 7)]
-    for a, b in edges:
-        pygame.draw.line(screen, (100, 100, 100), projected[a], projected[b])
+
+def make_world(seed=None):
+    # Sphere-sphere impulses between balls, found with the uniform grid broad
+    # phase; the few big balls among many small ones are tested separately
+    half = BOX_SIZE // 2
+    world = BallWorld((-half, -half, -half), (half, half, half), (0, -GRAVITY, 0),
+                      MATERIALS, seed=seed, trail_length=MAX_TRAJECTORY)
+    world.broad_phase = "grid"
+    world.response = "impulse"
+    world.sleeping = True
+    world.ccd = True
+    return world
+
+def add_random_balls(world, count, radius_range=(20, 30)):
+    rng = world.rng
+    half = BOX_SIZE // 2
+    world.add(rng.integers(-half, half + 1, (count, 3)), rng.uniform(-3, 3, (count, 3)),
+              rng.integers(radius_range[0], radius_range[1] + 1, count), 0, rng.integers(80, 256, (count, 3)))
+
+def draw_scene(surface, world, alpha=1.0):
+    # Box corners, ball centers and trail points go through the camera in one
+    # projection, then are drawn box first and balls far to near
+    n = world.count
+    color = world.color[:n]
+    pos = world.interpolated(alpha)
+    parts = [BOX_CORNERS, pos]
+    trails = 0 < n <= TRAIL_LIMIT
+    if trails:
+        points, filled = world.trails.ordered(n)
+        parts.append(points.reshape(-1, 3))
+    projected, depth, scale = camera.project(np.concatenate(parts))
+
+    corners = projected[:8].tolist()
+    for a, b in BOX_EDGES:
+        pygame.draw.line(surface, (100, 100, 100), corners[a], corners[b])
+
+    # Trails from the ring buffer
+    if trails:
+        draw_trails(surface, trail_layer, projected[8 + n:].reshape(points.shape[:2] + (2,)),
+                    filled, color, 100)
+
+    # Far balls first
+    radii = world.radius[:n] * scale[8:8 + n]
+    picks.build(projected[8:8 + n], radii, depth[8:8 + n])
+    order = np.argsort(-depth[8:8 + n], kind="stable")
+    centers = projected[8:8 + n][order].astype(int).tolist()
+    radii = radii[order]
+    colors = color[order]
+    highlights = np.minimum(colors.astype(int) + 50, 255)
+    for (x, y), r, c, h in zip(centers, radii.tolist(), colors.tolist(), highlights.tolist()):
+        pygame.draw.circle(surface, c, (x, y), int(r))
+        pygame.draw.circle(surface, h, (x, y), int(r * 0.3))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="3D bouncing balls")
+    parser.add_argument("--seed", type=int, default=None, help="seed for a repeatable run")
+    parser.add_argument("--record", metavar="PATH", help="record every tick to PATH (play back with replay.py)")
+    return parser.parse_args()
 
 def main():
-    global angle_x, angle_y
-    balls = [Ball3D() for _ in range(5)]
+    args = parse_args()
+    world = make_world(args.seed)
+    add_random_balls(world, 5)
     rotating, dragging = False, False
     selected_ball = None
     last_mouse_pos = (0, 0)
     rotate_sensitivity = 0.005
+    # The state at the start of every tick goes to the recording
+    recorder = Recorder(args.record, world, PHYSICS_RATE, args.seed) if args.record else None
+
+    def begin_tick():
+        if recorder is not None:
+            recorder.append(world)
+        world.begin_tick()
+
+    stepper = FixedStepper(world.step, PHYSICS_RATE, world.max_speed, world.max_travel,
+                           begin_tick=begin_tick)
 
     running = True
     while running:
+        frame_time = clock.tick(FPS) / 1000
         for event in pygame.event.get():
             if event.type == QUIT:
                 running = False
@@ -123,22 +138,22 @@ def main():
                     rotating = True
                     last_mouse_pos = pygame.mouse.get_pos()
                 elif event.button == 3:  # Right mouse
-                    mx, my = pygame.mouse.get_pos()
-                    for ball in reversed(balls):
-                        if ball.is_mouse_over(mx, my):
-                            selected_ball = ball
-                            selected_ball.dragged = True
-                            dragging = True
-                            last_mouse_pos = pygame.mouse.get_pos()
-                            break
+                    # Front-most ball under the cursor in the last drawn frame
+                    i = picks.pick(*pygame.mouse.get_pos())
+                    if i is not None and i < world.count:
+                        selected_ball = i
+                        world.pinned[i] = True
+                        world.wake(i)
+                        dragging = True
+                        last_mouse_pos = pygame.mouse.get_pos()
 
             elif event.type == MOUSEBUTTONUP:
                 if event.button == 1:
                     rotating = False
                 elif event.button == 3:
                     dragging = False
-                    if selected_ball:
-                        selected_ball.dragged = False
+                    if selected_ball is not None:
+                        world.pinned[selected_ball] = False
                         selected_ball = None
 
             elif event.type == MOUSEMOTION:
@@ -146,34 +161,48 @@ def main():
                 dx = mx - last_mouse_pos[0]
                 dy = my - last_mouse_pos[1]
                 if rotating:
-                    angle_y -= dx * rotate_sensitivity
-                    angle_x -= dy * rotate_sensitivity
-                elif dragging and selected_ball:
-                    selected_ball.x += dx * 0.5
-                    selected_ball.z += dy * 0.5
-                    selected_ball.vx = selected_ball.vz = 0
+                    camera.rotate(-dy * rotate_sensitivity, -dx * rotate_sensitivity)
+                elif dragging and selected_ball is not None:
+                    world.pos[selected_ball, 0] += dx * 0.5
+                    world.pos[selected_ball, 2] += dy * 0.5
+                    world.vel[selected_ball, 0] = world.vel[selected_ball, 2] = 0
                 last_mouse_pos = (mx, my)
 
             elif event.type == KEYDOWN:
                 if event.key == K_SPACE:
-                    balls.append(Ball3D())
+                    add_random_balls(world, 1)
+                elif event.key == K_b:
+                    # Add a batch of small balls
+                    add_random_balls(world, BATCH_SIZE, SMALL_RADIUS)
+                elif event.key == K_x:
+                    world.collisions = not world.collisions
                 elif event.key == K_c:
-                    balls = [Ball3D() for _ in range(5)]
+                    world.clear()
+                    add_random_balls(world, 5)
+                    dragging, selected_ball = False, None
 
-        for ball in balls:
-            ball.update()
+        alpha = stepper.advance(frame_time)
 
         screen.fill(BACKGROUND_COLOR)
-        draw_3d_box()
-        for ball in sorted(balls, key=lambda b: b.z, reverse=True):
-            ball.draw(screen)
-
-        for i, text in enumerate(["LMB: Rotate", "RMB: Drag Ball", "SPACE: Add Ball", "C: Reset"]):
+        camera.update()
+        draw_scene(screen, world, alpha)
+
+        # Outline the ball under the cursor (or the one being dragged)
+        hovered = selected_ball if dragging else picks.pick(*pygame.mouse.get_pos())
+        if hovered is not None:
+            center = picks.centers[hovered].astype(int).tolist()
+            pygame.draw.circle(screen, WHITE, center, int(picks.radii[hovered]) + 2, 1)
+
+        hud = ["LMB: Rotate", "RMB: Drag Ball", "SPACE: Add Ball", "B: Add 1000 Balls",
+               "X: Toggle Collisions", "C: Reset",
+               f"Balls: {world.count}  Collisions: {'on' if world.collisions else 'off'}  FPS: {clock.get_fps():.0f}"]
+        for i, text in enumerate(hud):
             screen.blit(font.render(text, True, WHITE), (10, 10 + i * 20))
 
         pygame.display.flip()
-        clock.tick(FPS)
 
+    if recorder is not None:
+        recorder.close()
     pygame.quit()
     sys.exit()
 
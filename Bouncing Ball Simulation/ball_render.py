@@ -0,0 +1,188 @@
+import numpy as np
+import pygame
+
+# Shared pygame drawing helpers for the ball demos
+
+TRAIL_ALPHA = 80
+
+def draw_trails(surface, layer, points, filled, colors, alpha=TRAIL_ALPHA):
+    # All trails are rasterised together onto one colour-keyed layer, which is
+    # faded and composited with a single blit. `points` is the (balls, length,
+    # 2) screen-space trail array from TrailBuffer.ordered; only the last
+    # filled[i] points are valid.
+    layer.fill((0, 0, 0))
+    layer.set_colorkey((0, 0, 0))
+    layer.set_alpha(alpha)
+    length = points.shape[1]
+    # Segment k of a trail joins points k and k + 1; both are valid from the
+    # first filled point on
+    ball, k = np.nonzero(np.arange(length - 1) >= (length - filled)[:, None])
+    if len(ball):
+        stroke(layer, points[ball, k], points[ball, k + 1], colors[ball])
+    surface.blit(layer, (0, 0))
+
+def stroke(surface, a, b, color):
+    # Two pixel wide segments from a[i] to b[i], all in a few NumPy passes:
+    # each segment is stepped one pixel at a time along its longer axis and
+    # thickened by one pixel across it, close to pygame.draw.lines(..., 2).
+    # Later segments are written over earlier ones, as if drawn in order.
+    width, height = surface.get_size()
+    a, b = np.rint(a).astype(np.float32), np.rint(b).astype(np.float32)
+    ax, ay, dx, dy = a[:, 0], a[:, 1], b[:, 0] - a[:, 0], b[:, 1] - a[:, 1]
+    keep = np.isfinite(ax + ay + dx + dy)
+    if not keep.all():
+        ax, ay, dx, dy, color = ax[keep], ay[keep], dx[keep], dy[keep], color[keep]
+    # Projected points can land far off screen; no segment needs more steps
+    # than it takes to cross it
+    flat = np.abs(dx) >= np.abs(dy)
+    steps = np.minimum(np.maximum(np.abs(dx), np.abs(dy)), width + height).astype(np.int64) + 1
+    seg = np.repeat(np.arange(len(ax)), steps)
+    t = np.arange(len(seg), dtype=np.float32)
+    t -= np.repeat((np.cumsum(steps) - steps).astype(np.float32), steps)
+    t *= np.repeat(1 / np.maximum(steps - 1, 1).astype(np.float32), steps)
+    x = np.rint(ax[seg] + dx[seg] * t).astype(np.int64)
+    y = np.rint(ay[seg] + dy[seg] * t).astype(np.int64)
+    # The second pixel is below mostly horizontal segments and right of the
+    # others; pixels on the last row or column are skipped with it
+    on = (x >= 0) & (x < width - 1) & (y >= 0) & (y < height - 1)
+    seg, first = seg[on], y[on] * width + x[on]
+    index = np.empty((len(seg), 2), dtype=np.int64)
+    index[:, 0] = first
+    index[:, 1] = first + np.where(flat, width, 1)[seg]
+    pixels, target, value = _pixel_target(surface, color)
+    if target is not None:
+        target[index.ravel()] = np.repeat(value[seg], 2)
+    else:
+        index = index.ravel()
+        pixels[index % width, index // width] = np.repeat(value[seg], 2, axis=0)
+    del pixels, target
+
+# Colour key for sprite backgrounds; no material uses it
+SPRITE_KEY = (255, 0, 255)
+
+class SpriteCache:
+    # Balls pre-rendered once per (material, radius) and then only blitted.
+    # `colors` maps a material id to its colour (e.g. MaterialTable.color).
+    def __init__(self, colors):
+        self.colors = colors
+        self.sprites = {}
+
+    def get(self, material, radius):
+        sprite = self.sprites.get((material, radius))
+        if sprite is None:
+            sprite = pygame.Surface((2 * radius, 2 * radius))
+            sprite.fill(SPRITE_KEY)
+            pygame.draw.circle(sprite, tuple(self.colors[material].tolist()), (radius, radius), radius)
+            sprite.set_colorkey(SPRITE_KEY, pygame.RLEACCEL)
+            self.sprites[(material, radius)] = sprite
+        return sprite
+
+    def draw(self, surface, pos, radius, material):
+        # Every ball in one Surface.blits call; same pixels as
+        # pygame.draw.circle(surface, color, (x, y), r)
+        get = self.get
+        surface.blits([(get(m, r), (x - r, y - r))
+                       for (x, y), r, m in zip(pos.tolist(), radius.tolist(), material.tolist())],
+                      doreturn=False)
+
+class GlyphCache:
+    # Rendered text surfaces keyed by string, for labels and HUD lines that
+    # repeat from frame to frame. Emptied when it grows past `limit` entries
+    # so changing text (FPS, counters) can't fill memory.
+    def __init__(self, font, color=(255, 255, 255), limit=256):
+        self.font = font
+        self.color = color
+        self.limit = limit
+        self.glyphs = {}
+
+    def get(self, text):
+        glyph = self.glyphs.get(text)
+        if glyph is None:
+            if len(self.glyphs) >= self.limit:
+                self.glyphs.clear()
+            glyph = self.glyphs[text] = self.font.render(text, True, self.color)
+        return glyph
+
+# Pixel offsets covered by a disc of each whole-pixel radius, taken from
+# pygame.draw.circle itself so splats look exactly like drawn balls; radius 0
+# is a single point
+_DISCS = {}
+# Most (ball, pixel) writes splat() does in one NumPy pass
+SPLAT_CHUNK = 1 << 21
+
+def _disc(r):
+    disc = _DISCS.get(r)
+    if disc is None:
+        if r == 0:
+            disc = (np.zeros(1, dtype=np.int32), np.zeros(1, dtype=np.int32))
+        else:
+            stamp = pygame.Surface((2 * r + 2, 2 * r + 2))
+            pygame.draw.circle(stamp, (255, 255, 255), (r, r), r)
+            dx, dy = np.nonzero(pygame.surfarray.array2d(stamp))
+            disc = ((dx - r).astype(np.int32), (dy - r).astype(np.int32))
+        _DISCS[r] = disc
+    return disc
+
+def _mapped(surface, color):
+    # Surface pixel values for an (n, 3) colour array, like Surface.map_rgb
+    shifts, masks = surface.get_shifts(), surface.get_masks()
+    color = color.astype(np.uint32)
+    value = np.full(len(color), masks[3], dtype=np.uint32)
+    for channel in range(3):
+        value |= (color[:, channel] << shifts[channel]) & masks[channel]
+    return value
+
+def _pixel_target(surface, color):
+    # (pixels, flat target, values) for writing `color` straight into the
+    # surface: one 32-bit write per pixel through a flat (row-major) view when
+    # the surface allows it, else RGB writes through pixels3d
+    if surface.get_bytesize() == 4:
+        pixels = pygame.surfarray.pixels2d(surface)
+        target = pixels.T.reshape(-1) if pixels.T.flags.c_contiguous else None
+        return pixels, target, _mapped(surface, color)
+    return pygame.surfarray.pixels3d(surface), None, color
+
+def splat(surface, pos, radius, color):
+    # Write every ball straight into the surface's pixels. Balls are bucketed
+    # by whole-pixel radius and each bucket stamps its disc mask at all of its
+    # centres in one fancy-indexed assignment; balls under half a pixel are
+    # single points. No per-ball Python calls, so it keeps up with hundreds of
+    # thousands of small balls, where pygame.draw.circle can't. Big balls are
+    # cheaper as sprites.
+    #
+    # Buckets are written out of ball order, so `owner` keeps the index of the
+    # ball each pixel was last written by, and a pixel only takes a ball's
+    # colour when that ball comes later. Overlapping balls then look the same
+    # as drawn one by one in index order.
+    width, height = surface.get_size()
+    pixels, target, value = _pixel_target(surface, color)
+    # 32-bit indices: these arrays are as long as the pixel writes
+    owner = np.full(width * height, -1, dtype=np.int32)
+    x, y = np.rint(pos).astype(np.int32).T
+    r = np.rint(radius).astype(np.int32)
+    for size in np.unique(r):
+        idx = np.nonzero(r == size)[0].astype(np.int32)
+        dx, dy = _disc(max(int(size), 0))
+        # Only discs crossing the screen edge need each pixel checked
+        whole = (x[idx] >= size) & (x[idx] < width - size) & (y[idx] >= size) & (y[idx] < height - size)
+        step = max(1, SPLAT_CHUNK // len(dx))
+        for balls, clip in ((idx[whole], False), (idx[~whole], True)):
+            for start in range(0, len(balls), step):
+                b = balls[start:start + step]
+                ball = np.repeat(b, len(dx))
+                if clip:
+                    px = (x[b, None] + dx).ravel()
+                    py = (y[b, None] + dy).ravel()
+                    on = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+                    k, ball = (py * width + px)[on], ball[on]
+                else:
+                    k = ((y[b] * width + x[b])[:, None] + (dy * width + dx)).ravel()
+                later = ball > owner[k]
+                k, ball = k[later], ball[later]
+                # Within one assignment the last (highest) ball wins
+                owner[k] = ball
+                if target is not None:
+                    target[k] = value[ball]
+                else:
+                    pixels[k % width, k // width] = value[ball]
+    del pixels, target
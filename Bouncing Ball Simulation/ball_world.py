@@ -0,0 +1,520 @@
+import numpy as np
+from broad_phase import BROAD_PHASES, StaticGrid
+from fixed_step import lerp
+
+# CCD: impacts this close in distance count as contacts, and impacts within
+# this fraction of the remaining step of the earliest one are resolved with it
+IMPACT_SLACK = 1e-6
+IMPACT_WINDOW = 1e-6
+
+# Sleepers above a ball that wakes and this close to it count as resting on
+# it, and wake too
+WAKE_MARGIN = 1.0
+
+# Ball materials with different properties
+MATERIALS = {
+    "rubber": {"elasticity": 0.8, "friction": 0.99, "color": (255, 0, 0)},
+    "glass": {"elasticity": 0.95, "friction": 0.998, "color": (0, 100, 255)},
+    "steel": {"elasticity": 0.7, "friction": 0.95, "color": (200, 200, 200)},
+    "wood": {"elasticity": 0.6, "friction": 0.9, "color": (139, 69, 19)}
+}
+
+# Material properties as arrays indexed by material id, so per-ball lookups are
+# one gather instead of a dict lookup per access
+class MaterialTable:
+    def __init__(self, materials):
+        self.names = list(materials)
+        self.elasticity = np.array([m["elasticity"] for m in materials.values()], dtype=np.float64)
+        self.friction = np.array([m["friction"] for m in materials.values()], dtype=np.float64)
+        self.color = np.array([m["color"] for m in materials.values()], dtype=np.uint8)
+
+    def index(self, name):
+        return self.names.index(name)
+
+# Fixed-size trail history for every ball: one preallocated (balls, length, dims)
+# ring buffer shared by all balls, written at a common head index each step.
+# `filled` counts how many of a ball's slots hold real points, so balls added
+# later only show the part of the history they were alive for.
+class TrailBuffer:
+    def __init__(self, capacity, length, dims):
+        self.length = length
+        self.dims = dims
+        self.head = 0
+        self.points = np.zeros((capacity, length, dims), dtype=np.float32)
+        self.filled = np.zeros(capacity, dtype=np.int32)
+
+    def resize(self, capacity, count):
+        points = np.zeros((capacity, self.length, self.dims), dtype=np.float32)
+        filled = np.zeros(capacity, dtype=np.int32)
+        points[:count] = self.points[:count]
+        filled[:count] = self.filled[:count]
+        self.points, self.filled = points, filled
+
+    def reset(self, idx):
+        self.filled[idx] = 0
+
+    def record(self, pos):
+        n = len(pos)
+        self.points[:n, self.head] = pos
+        self.head = (self.head + 1) % self.length
+        np.minimum(self.filled[:n] + 1, self.length, out=self.filled[:n])
+
+    def ordered(self, n):
+        # (n, length, dims) view of every trail from oldest to newest; only the
+        # last filled[i] points of ball i are valid
+        return self.points[:n, (self.head + np.arange(self.length)) % self.length], self.filled[:n]
+
+# Ball state stored as structure-of-arrays: position, velocity, radius, material id
+# and color live in contiguous arrays and every step is applied to all balls at
+# once. Works in 2D or 3D depending on the length of the box bounds.
+class BallWorld:
+    def __init__(self, lo, hi, gravity, materials=MATERIALS, capacity=64, seed=None, trail_length=0):
+        self.lo = np.asarray(lo, dtype=np.float64)
+        self.hi = np.asarray(hi, dtype=np.float64)
+        self.dims = len(self.lo)
+        self.gravity = np.asarray(gravity, dtype=np.float64)
+        self.materials = MaterialTable(materials)
+        self.rng = np.random.default_rng(seed)
+        self.collisions = True
+        self.broad_phase = "grid"  # "grid", "sap" or "all" (see broad_phase.py)
+        self.response = "exchange"  # "exchange" or "impulse" (see RESPONSES)
+        # Sleeping: a ball slower than sleep_speed for sleep_time ticks stops
+        # and is skipped until a faster ball hits it, a ball it rests on wakes,
+        # or it is woken explicitly.
+        # Balls resting in a pile under gravity 0.5 keep jittering at up to
+        # about 1.5 per tick, hence the threshold.
+        self.sleeping = False
+        self.sleep_speed = 2.0
+        self.sleep_time = 30
+        self._sleeper_grid = None
+        # Continuous collision detection: move to each wall or ball impact in
+        # turn instead of stepping and then fixing overlaps, up to
+        # ccd_iterations impacts per step
+        self.ccd = False
+        self.ccd_iterations = 8
+        self.count = 0
+        self.trails = TrailBuffer(capacity, trail_length, self.dims) if trail_length else None
+        self.prev_pos = np.zeros((0, self.dims))
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = self.count
+        pos = np.zeros((capacity, self.dims))
+        vel = np.zeros((capacity, self.dims))
+        radius = np.zeros(capacity)
+        material = np.zeros(capacity, dtype=np.int32)
+        color = np.zeros((capacity, 3), dtype=np.uint8)
+        pinned = np.zeros(capacity, dtype=bool)
+        asleep = np.zeros(capacity, dtype=bool)
+        still = np.zeros(capacity)
+        if old:
+            pos[:old] = self.pos[:old]
+            vel[:old] = self.vel[:old]
+            radius[:old] = self.radius[:old]
+            material[:old] = self.material[:old]
+            color[:old] = self.color[:old]
+            pinned[:old] = self.pinned[:old]
+            asleep[:old] = self.asleep[:old]
+            still[:old] = self.still[:old]
+        self.pos, self.vel, self.radius, self.material, self.color = pos, vel, radius, material, color
+        # Pinned balls (e.g. held by the mouse) skip gravity and integration
+        self.pinned = pinned
+        # Sleep state and how long (in ticks) each ball has been slow
+        self.asleep, self.still = asleep, still
+        if self.trails is not None and len(self.trails.filled) != capacity:
+            self.trails.resize(capacity, old)
+
+    def add(self, pos, vel, radius, material, color=None):
+        # Append one ball or a batch (leading axis); returns the new indices
+        pos = np.asarray(pos, dtype=np.float64).reshape(-1, self.dims)
+        k = len(pos)
+        if self.count + k > len(self.pos):
+            self._allocate(max(2 * len(self.pos), self.count + k))
+        if isinstance(material, str):
+            material = self.materials.index(material)
+        material = np.broadcast_to(np.asarray(material, dtype=np.int32), (k,))
+
+        idx = np.arange(self.count, self.count + k)
+        self.pos[idx] = pos
+        self.vel[idx] = np.asarray(vel, dtype=np.float64).reshape(-1, self.dims)
+        self.radius[idx] = radius
+        self.material[idx] = material
+        self.color[idx] = self.materials.color[material] if color is None else color
+        self.pinned[idx] = False
+        self.asleep[idx] = False
+        self.still[idx] = 0
+        if self.trails is not None:
+            self.trails.reset(idx)
+        self.count += k
+        return idx
+
+    def clear(self):
+        self.count = 0
+        self.prev_pos = self.prev_pos[:0]
+        self._sleeper_grid = None
+
+    def wake(self, idx):
+        # Waking a ball also wakes the sleepers resting on it (touching it from
+        # above, against gravity), and the ones resting on those in turn, so
+        # none is left hanging in the air when its support moves away
+        n = self.count
+        frontier = np.unique(np.atleast_1d(idx))
+        asleep = self.asleep[:n]
+        changed = bool(asleep[frontier].any())
+        grid = self.sleeper_grid(float(self.radius[:n].max())) if changed else None
+        self.still[frontier] = 0
+        asleep[frontier] = False
+        while grid is not None and len(frontier):
+            q, g = grid.query(self.pos[frontier], self.radius[frontier])
+            q = frontier[q]
+            d = self.pos[g] - self.pos[q]
+            reach = self.radius[q] + self.radius[g] + WAKE_MARGIN
+            resting = (np.einsum('ij,ij->i', d, d) < reach ** 2) & (d @ self.gravity < 0)
+            frontier = np.unique(g[resting])
+            frontier = frontier[asleep[frontier]]
+            asleep[frontier] = False
+            self.still[frontier] = 0
+        if changed:
+            self._sleeper_grid = None
+
+    def state(self):
+        n = self.count
+        return self.pos[:n], self.vel[:n], self.radius[:n], self.material[:n]
+
+    def step(self, dt=1.0):
+        # Returns the number of ball-ball contacts resolved this step
+        n = self.count
+        pos, vel, radius, material = self.state()
+        asleep = self.asleep[:n] if self.sleeping else np.zeros(n, dtype=bool)
+        # Apply gravity and update positions
+        pinned = self.pinned[:n]
+        contacts = 0
+        if self.ccd:
+            free = ~(pinned | asleep)
+            vel[free] += self.gravity * dt
+            contacts += self.sweep(dt, free)
+            self.collide_walls(np.nonzero(~asleep)[0])
+        elif not (pinned.any() or asleep.any()):
+            vel += self.gravity * dt
+            pos += vel * dt
+            self.collide_walls()
+        else:
+            free = ~(pinned | asleep)
+            vel[free] += self.gravity * dt
+            pos[free] += vel[free] * dt
+            # Held balls still stay inside the box
+            self.collide_walls(np.nonzero(~asleep)[0])
+        # Overlaps left over (resting contacts, or more impacts than CCD had
+        # iterations for) are still resolved the discrete way
+        if self.collisions:
+            contacts += self.collide_balls()
+            # Contact pushes in a deep pile can reach past the walls; put the
+            # balls back inside without touching their velocities
+            np.clip(pos, self.lo + radius[:, None], self.hi - radius[:, None], out=pos)
+        if self.sleeping:
+            self.update_sleep(dt)
+        return contacts
+
+    def update_sleep(self, dt):
+        n = self.count
+        vel, asleep, still = self.vel[:n], self.asleep[:n], self.still[:n]
+        slow = np.einsum('ij,ij->i', vel, vel) < self.sleep_speed ** 2
+        slow &= ~(asleep | self.pinned[:n])
+        still[slow] += dt
+        still[~slow] = 0
+        settled = np.nonzero(still >= self.sleep_time)[0]
+        if len(settled):
+            asleep[settled] = True
+            vel[settled] = 0
+            still[settled] = 0
+            self._sleeper_grid = None
+
+    def begin_tick(self):
+        # Called by FixedStepper before each tick: keep the state to interpolate
+        # from and record one trail point per tick (not per substep)
+        pos = self.pos[:self.count]
+        self.prev_pos = pos.copy()
+        if self.trails is not None:
+            self.trails.record(pos)
+
+    def interpolated(self, alpha):
+        # Render positions between the previous and current tick; balls added
+        # since the last tick are drawn where they are
+        pos = self.pos[:self.count].copy()
+        m = min(len(self.prev_pos), self.count)
+        pos[:m] = lerp(self.prev_pos[:m], pos[:m], alpha)
+        return pos
+
+    def max_speed(self):
+        vel = self.vel[:self.count]
+        return float(np.sqrt(np.einsum('ij,ij->i', vel, vel).max())) if self.count else 0.0
+
+    def min_radius(self):
+        return float(self.radius[:self.count].min()) if self.count else 1.0
+
+    def max_travel(self):
+        # How far a ball may move in one substep (see FixedStepper); CCD
+        # catches every impact on its own, so it needs no substeps
+        return np.inf if self.ccd else self.min_radius() / 2
+
+    def collide_walls(self, idx=None):
+        if idx is None:
+            wall_response(*self.state(), self.materials, self.lo, self.hi)
+            return
+        p, v = self.pos[idx], self.vel[idx]
+        wall_response(p, v, self.radius[idx], self.material[idx], self.materials, self.lo, self.hi)
+        self.pos[idx], self.vel[idx] = p, v
+
+    def candidate_pairs(self, pos=None, radius=None):
+        # Candidate pairs (i, j) of awake balls, plus pairs (q, g) of an awake
+        # ball q against a sleeping ball g from the cached sleeper grid; pairs
+        # of sleeping balls are never looked at. CCD passes swept bounds as
+        # pos and radius.
+        n = self.count
+        if pos is None:
+            pos, radius = self.pos[:n], self.radius[:n]
+        none = np.zeros(0, dtype=np.int64)
+        asleep = self.asleep[:n]
+        if not (self.sleeping and asleep.any()):
+            i, j = BROAD_PHASES[self.broad_phase](pos, radius)
+            return i, j, none, none
+        awake = np.nonzero(~asleep)[0]
+        if len(awake) == 0:
+            return none, none, none, none
+        i, j = BROAD_PHASES[self.broad_phase](pos[awake], radius[awake])
+        grid = self.sleeper_grid(float(radius[awake].max()))
+        q, g = grid.query(pos[awake], radius[awake])
+        return awake[i], awake[j], awake[q], g
+
+    def collide_balls(self):
+        if self.count < 2:
+            return 0
+        return self.resolve_contacts(*self.candidate_pairs())
+
+    def resolve_contacts(self, i, j, q, g, slack=0.0):
+        pos, vel, radius, material = self.state()
+        if len(q) == 0:
+            return RESPONSES[self.response](pos, vel, radius, material, self.materials, i, j, slack)
+
+        # A sleeping ball hit by a fast ball wakes up and responds normally;
+        # one touched by a slow ball stays put and only the slow ball responds
+        asleep = self.asleep[:self.count]
+        d = pos[q] - pos[g]
+        touching = np.einsum('ij,ij->i', d, d) < (radius[q] + radius[g] + slack) ** 2
+        fast = np.einsum('ij,ij->i', vel[q], vel[q]) > self.sleep_speed ** 2
+        woken = np.unique(g[touching & fast])
+        if len(woken):
+            self.wake(woken)
+        resting = np.unique(g[touching & ~fast])
+        resting = resting[asleep[resting]]
+        held_pos, held_vel = pos[resting], vel[resting]
+        contacts = RESPONSES[self.response](pos, vel, radius, material, self.materials,
+                                 np.concatenate((i, q)), np.concatenate((j, g)), slack)
+        pos[resting], vel[resting] = held_pos, held_vel
+        return contacts
+
+    def sweep(self, dt, free):
+        # Continuous collision over one step: find the earliest time of impact
+        # of any fast ball with a wall or another ball, move everything there,
+        # resolve that impact (and any at the same moment) and repeat. A ball
+        # is fast when it moves farther than its radius in the step; slow
+        # balls, and balls already overlapping (which have no time of
+        # impact), are left to the discrete pass that follows.
+        pos, vel, radius, material = self.state()
+        speed = np.sqrt(np.einsum('ij,ij->i', vel, vel))
+        fast = free & (speed * dt > radius)
+        if not fast.any():
+            pos[free] += vel[free] * dt
+            return 0
+
+        # Candidate pairs for the whole step come from bounds swept over dt;
+        # an impact that throws a ball out of its swept bounds leaves any
+        # later contact to the discrete pass
+        moving = np.where(free[:, None], vel, 0.0)
+        none = np.zeros(0, dtype=np.int64)
+        pairs = (none,) * 4
+        if self.collisions and self.count > 1:
+            i, j, q, g = self.candidate_pairs(pos + moving * (dt / 2), radius + speed * free * dt / 2)
+            keep = fast[i] | fast[j]
+            pairs = (i[keep], j[keep]) + ((q, g) if not len(q) else (q[fast[q]], g[fast[q]]))
+            # Only pairs that would meet within the step on their current paths
+            t, walls, hits = self.earliest_impact(moving, dt, fast, pairs, window=np.inf)
+            pairs = hits if walls is not None else (none,) * 4
+
+        remaining = dt
+        contacts = 0
+        for _ in range(self.ccd_iterations):
+            if remaining <= 0:
+                break
+            moving = np.where(free[:, None], vel, 0.0)
+            t, walls, hits = self.earliest_impact(moving, remaining, fast, pairs)
+            if walls is None:
+                break
+            pos += moving * t
+            remaining -= t
+            self.wall_impacts(*walls)
+            if self.collisions:
+                contacts += self.resolve_contacts(*hits, slack=IMPACT_SLACK)
+        pos += np.where(free[:, None], vel, 0.0) * remaining
+        return contacts
+
+    def earliest_impact(self, vel, remaining, fast, pairs, window=IMPACT_WINDOW):
+        # Returns (t, (balls, axes), (i, j, q, g)) for the impacts at the
+        # earliest time t within `remaining`, or (remaining, None, None).
+        # Impacts up to window * remaining later than t are included too.
+        pos, radius = self.pos[:self.count], self.radius[:self.count]
+
+        # Walls: time until the ball's surface reaches the wall it moves toward
+        with np.errstate(divide='ignore', invalid='ignore'):
+            wall_t = np.where(vel > 0, (self.hi - radius[:, None] - pos) / vel,
+                              np.where(vel < 0, (self.lo + radius[:, None] - pos) / vel, np.inf))
+        wall_t[~((wall_t >= 0) & fast[:, None])] = np.inf
+        t = float(wall_t.min(initial=np.inf))
+
+        # Balls: smallest root of |d + v t| = r_i + r_j for approaching pairs
+        i, j, q, g = pairs
+        a_idx, b_idx = np.concatenate((i, q)), np.concatenate((j, g))
+        d = pos[a_idx] - pos[b_idx]
+        v = vel[a_idx] - vel[b_idx]
+        a = np.einsum('ij,ij->i', v, v)
+        b = np.einsum('ij,ij->i', d, v)
+        c = np.einsum('ij,ij->i', d, d) - (radius[a_idx] + radius[b_idx]) ** 2
+        disc = b * b - a * c
+        hit = (c > 0) & (b < 0) & (disc >= 0)
+        pair_t = np.full(len(a), np.inf)
+        pair_t[hit] = (-b[hit] - np.sqrt(disc[hit])) / a[hit]
+        t = min(t, float(pair_t.min(initial=np.inf)))
+
+        if t > remaining:
+            return remaining, None, None
+        # Impacts within a hair of the earliest one are resolved together
+        when = min(t + window * remaining, remaining)
+        balls, axes = np.nonzero(wall_t <= when)
+        soon = pair_t <= when
+        split = len(i)
+        return t, (balls, axes), (i[soon[:split]], j[soon[:split]], q[soon[split:]], g[soon[split:]])
+
+    def wall_impacts(self, balls, axes):
+        # Balls exactly touching a wall and moving into it: reflect the normal
+        # velocity and apply friction to the rest, as in wall_response
+        if len(balls) == 0:
+            return
+        pos, vel, radius, material = self.state()
+        elasticity = self.materials.elasticity[material[balls]]
+        friction = self.materials.friction[material[balls]]
+        high = vel[balls, axes] > 0
+        pos[balls, axes] = np.where(high, self.hi[axes] - radius[balls], self.lo[axes] + radius[balls])
+        vel[balls, axes] = -vel[balls, axes] * elasticity
+        for other in range(self.dims):
+            rest = axes != other
+            vel[balls[rest], other] *= friction[rest]
+
+    def sleeper_grid(self, query_radius):
+        # Rebuilt only when the set of sleeping balls changes, or when a
+        # bigger ball than the cells allow for comes looking
+        grid = self._sleeper_grid
+        if grid is None or grid.cell < grid.max_radius + query_radius:
+            ids = np.nonzero(self.asleep[:self.count])[0]
+            radius = self.radius[ids]
+            cell = float(radius.max()) + max(query_radius, float(self.radius[:self.count].max()))
+            grid = self._sleeper_grid = StaticGrid(self.pos[ids], radius, cell, ids)
+        return grid
+
+def wall_response(pos, vel, radius, material, materials, lo, hi):
+    # Each axis in turn, like the scalar wall checks: reflect the normal
+    # velocity with the material elasticity and apply friction to the rest
+    elasticity = materials.elasticity[material]
+    friction = materials.friction[material]
+    for axis in range(pos.shape[1]):
+        low = pos[:, axis] - radius < lo[axis]
+        high = ~low & (pos[:, axis] + radius > hi[axis])
+        hit = np.nonzero(low | high)[0]
+        if len(hit) == 0:
+            continue
+        pos[low, axis] = lo[axis] + radius[low]
+        pos[high, axis] = hi[axis] - radius[high]
+        vel[hit, axis] = -vel[hit, axis] * elasticity[hit]
+        for other in range(pos.shape[1]):
+            if other != axis:
+                vel[hit, other] *= friction[hit]
+
+def resolve_pairs(pos, vel, radius, material, materials, i, j, slack=0.0):
+    # Bulk narrow phase for candidate pairs (i, j). Overlapping balls are pushed
+    # apart along the center line and exchange velocities scaled by the mean
+    # elasticity and friction. A ball touching several others takes the sum of
+    # the pushes and the average of the velocities it receives. Balls up to
+    # `slack` apart also count as touching (CCD impacts are exact contacts).
+    d = pos[i] - pos[j]
+    dist = np.sqrt(np.einsum('ij,ij->i', d, d))
+    touching = dist < radius[i] + radius[j] + slack
+    if not touching.any():
+        return 0
+    i, j, d, dist = i[touching], j[touching], d[touching], dist[touching]
+
+    normal = np.zeros_like(d)
+    normal[:, 0] = 1.0
+    apart = dist > 0
+    normal[apart] = d[apart] / dist[apart, None]
+    push = (np.maximum(radius[i] + radius[j] - dist, 0) / 2)[:, None] * normal
+
+    elasticity = ((materials.elasticity[material[i]] + materials.elasticity[material[j]]) / 2)[:, None]
+    friction = ((materials.friction[material[i]] + materials.friction[material[j]]) / 2)[:, None]
+    received = np.zeros_like(vel)
+    np.add.at(received, i, vel[j] * elasticity * friction)
+    np.add.at(received, j, vel[i] * elasticity * friction)
+    contacts = np.bincount(np.concatenate((i, j)), minlength=len(pos))
+
+    np.add.at(pos, i, push)
+    np.subtract.at(pos, j, push)
+    hit = contacts > 0
+    vel[hit] = received[hit] / contacts[hit, None]
+    return len(i)
+
+def resolve_impulses(pos, vel, radius, material, materials, i, j, slack=0.0):
+    # Bulk impulse response for candidate pairs (i, j), with each ball's mass
+    # proportional to its volume. Overlapping balls are pushed apart in
+    # proportion to their inverse masses; approaching pairs get a normal
+    # impulse with the mean elasticity as restitution, and the mean friction
+    # keeps that fraction of the tangential relative velocity. A ball touching
+    # several others takes the sum of the pushes and the average of its
+    # velocity changes, like resolve_pairs.
+    d = pos[i] - pos[j]
+    dist = np.sqrt(np.einsum('ij,ij->i', d, d))
+    touching = dist < radius[i] + radius[j] + slack
+    if not touching.any():
+        return 0
+    i, j, d, dist = i[touching], j[touching], d[touching], dist[touching]
+
+    normal = np.zeros_like(d)
+    normal[:, 0] = 1.0
+    apart = dist > 0
+    normal[apart] = d[apart] / dist[apart, None]
+    inv_mass = radius ** -pos.shape[1]
+    wi, wj = inv_mass[i], inv_mass[j]
+    w = wi + wj
+
+    overlap = np.maximum(radius[i] + radius[j] - dist, 0)
+    np.add.at(pos, i, (overlap * wi / w)[:, None] * normal)
+    np.subtract.at(pos, j, (overlap * wj / w)[:, None] * normal)
+
+    elasticity = (materials.elasticity[material[i]] + materials.elasticity[material[j]]) / 2
+    friction = ((materials.friction[material[i]] + materials.friction[material[j]]) / 2)[:, None]
+    rel = vel[i] - vel[j]
+    closing = np.einsum('ij,ij->i', rel, normal)
+    approaching = (closing < 0)[:, None]
+    tangent = rel - closing[:, None] * normal
+    impulse = (-(1 + elasticity) * closing / w)[:, None] * normal - (1 - friction) * tangent / w[:, None]
+    impulse *= approaching
+
+    change = np.zeros_like(vel)
+    np.add.at(change, i, impulse * wi[:, None])
+    np.subtract.at(change, j, impulse * wj[:, None])
+    contacts = np.bincount(np.concatenate((i, j)), minlength=len(pos))
+    hit = contacts > 0
+    vel[hit] += change[hit] / contacts[hit, None]
+    return len(i)
+
+RESPONSES = {
+    "exchange": resolve_pairs,
+    "impulse": resolve_impulses,
+}
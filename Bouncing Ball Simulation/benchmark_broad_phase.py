@@ -0,0 +1,71 @@
+import argparse
+import time
+import numpy as np
+
+from ball_world import BallWorld
+from broad_phase import BROAD_PHASES
+
+# Compares the collision broad phases on random ball scenes. The box grows with
+# the ball count so density stays constant; all-pairs is skipped once it would
+# need more than BRUTE_LIMIT balls.
+BRUTE_LIMIT = 5000
+
+
+def make_world(count, dims, radius_range, density, seed):
+    side = (count * np.mean(radius_range) ** dims / density) ** (1 / dims)
+    world = BallWorld(np.zeros(dims), np.full(dims, side), np.zeros(dims), seed=seed)
+    rng = world.rng
+    radius = rng.uniform(radius_range[0], radius_range[1], count)
+    pos = rng.uniform(radius_range[1], side - radius_range[1], (count, dims))
+    world.add(pos, rng.uniform(-2, 2, (count, dims)), radius, rng.integers(0, 4, count))
+    return world
+
+
+def overlapping(world, i, j):
+    pos, vel, radius, material = world.state()
+    d = pos[i] - pos[j]
+    touching = np.einsum('ij,ij->i', d, d) < (radius[i] + radius[j]) ** 2
+    pairs = np.sort(np.stack((i[touching], j[touching]), axis=1), axis=1)
+    return set(map(tuple, pairs.tolist()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark grid vs sweep-and-prune broad phases")
+    parser.add_argument("--counts", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--dims", type=int, default=2, choices=(2, 3))
+    parser.add_argument("--density", type=float, default=0.1, help="fraction of the box covered by balls")
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'balls':>8} {'method':>6} {'candidates':>11} {'contacts':>9} {'pairs ms':>9} {'step ms':>9}")
+    for count in args.counts:
+        reference = None
+        for name, pairs_fn in BROAD_PHASES.items():
+            if name == "all" and count > BRUTE_LIMIT:
+                continue
+            world = make_world(count, args.dims, (2, 5), args.density, args.seed)
+            pos, vel, radius, material = world.state()
+
+            start = time.perf_counter()
+            i, j = pairs_fn(pos, radius)
+            pairs_time = time.perf_counter() - start
+
+            # Every method must find the same overlapping pairs
+            found = overlapping(world, i, j)
+            if reference is None:
+                reference = found
+            elif found != reference:
+                raise AssertionError(f"{name} missed {len(reference - found)} contacts at {count} balls")
+
+            world.broad_phase = name
+            start = time.perf_counter()
+            for _ in range(args.steps):
+                world.step()
+            step_time = (time.perf_counter() - start) / args.steps
+            print(f"{count:>8} {name:>6} {len(i):>11} {len(found):>9} "
+                  f"{pairs_time * 1000:>9.2f} {step_time * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import itertools
+import numpy as np
+
+# Broad phase: cheap candidate pairs (i, j) with i != j that the narrow phase
+# then checks for real overlap. Both methods are rebuilt from scratch every
+# step and work in 2D or 3D.
+
+def _expand(first, start, counts):
+    # Pairs (first[k], start[k] + m) for every m < counts[k], without a Python loop
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    offsets = np.cumsum(counts) - counts
+    a = np.repeat(first, counts)
+    b = np.repeat(start, counts) + (np.arange(total) - np.repeat(offsets, counts))
+    return a, b
+
+def half_stencil(dims):
+    # Neighbour cell offsets where the first non-zero component is positive, plus
+    # the cell itself: each unordered pair of neighbouring cells is visited once
+    offsets = [o for o in itertools.product((-1, 0, 1), repeat=dims)
+               if next((c for c in o if c != 0), 1) > 0]
+    return np.array(offsets, dtype=np.int64)
+
+# Cells are never sized for balls more than this many times the median radius;
+# the few larger ones are box-tested against every ball instead
+BIG_RATIO = 2.0
+
+def _big_pairs(pos, radius, big):
+    # Pairs (big ball, any ball) whose bounding boxes overlap, a chunk of big
+    # balls at a time; pairs of two big balls are kept once
+    is_big = np.zeros(len(pos), dtype=bool)
+    is_big[big] = True
+    pairs_i, pairs_j = [], []
+    chunk = max(1, (1 << 20) // len(pos))
+    for start in range(0, len(big), chunk):
+        b = big[start:start + chunk]
+        reach = (radius[b, None] + radius[None, :])[..., None]
+        near = np.all(np.abs(pos[None, :, :] - pos[b, None, :]) <= reach, axis=2)
+        k, j = np.nonzero(near)
+        i = b[k]
+        keep = (j != i) & (~is_big[j] | (j > i))
+        pairs_i.append(i[keep])
+        pairs_j.append(j[keep])
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+def grid_pairs(pos, radius, cell=None):
+    # Uniform grid (spatial hash over a dense key range) with cells as wide as the
+    # largest ball, so overlapping balls always sit in the same or adjacent cells.
+    # When a few balls are much larger than the rest they are left out of the
+    # grid so the cells stay small.
+    n = len(pos)
+    if n < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if cell is None:
+        cell = 2 * min(float(radius.max()), BIG_RATIO * float(np.median(radius)))
+    big = 2 * radius > cell
+    if big.any():
+        small = np.nonzero(~big)[0]
+        i, j = grid_pairs(pos[small], radius[small], cell)
+        bi, bj = _big_pairs(pos, radius, np.nonzero(big)[0])
+        return np.concatenate((small[i], bi)), np.concatenate((small[j], bj))
+    coords = np.floor((pos - pos.min(axis=0)) / cell).astype(np.int64) + 1
+    shape = coords.max(axis=0) + 2
+    strides = np.cumprod(np.concatenate(([1], shape[:-1])))
+    keys = coords @ strides
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    # Each occupied cell is looked up once per stencil offset, and the queries
+    # arrive in sorted order
+    cell_keys, cell_start, cell_count = np.unique(sorted_keys, return_index=True, return_counts=True)
+    pairs_i, pairs_j = [], []
+    for offset in half_stencil(pos.shape[1]):
+        neighbour = cell_keys + offset @ strides
+        lo = np.searchsorted(cell_keys, neighbour)
+        found = (lo < len(cell_keys)) & (cell_keys[np.minimum(lo, len(cell_keys) - 1)] == neighbour)
+        src, dst = np.nonzero(found)[0], lo[found]
+        # Every ball of the source cell against every ball of the neighbour cell
+        a, slot = _expand(np.arange(len(src)), np.zeros(len(src), dtype=np.int64),
+                          cell_count[src] * cell_count[dst])
+        width = cell_count[dst][a]
+        a_ball = cell_start[src][a] + slot // width
+        b_ball = cell_start[dst][a] + slot % width
+        if not offset.any():
+            keep = a_ball < b_ball
+            a_ball, b_ball = a_ball[keep], b_ball[keep]
+        pairs_i.append(order[a_ball])
+        pairs_j.append(order[b_ball])
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+class StaticGrid:
+    # Uniform grid over a set of balls that don't move (e.g. sleeping ones),
+    # built once and then queried with other balls every step. Cells must be at
+    # least as wide as the largest query radius plus the largest stored radius.
+    def __init__(self, pos, radius, cell, ids=None):
+        self.cell = cell
+        self.dims = pos.shape[1]
+        self.ids = np.arange(len(pos)) if ids is None else ids
+        self.max_radius = float(radius.max()) if len(radius) else 0.0
+        self.origin = pos.min(axis=0) - cell if len(pos) else np.zeros(self.dims)
+        coords = np.floor((pos - self.origin) / cell).astype(np.int64)
+        self.shape = coords.max(axis=0) + 2 if len(pos) else np.ones(self.dims, dtype=np.int64)
+        self.strides = np.cumprod(np.concatenate(([1], self.shape[:-1])))
+        keys = coords @ self.strides
+        self.order = np.argsort(keys, kind='stable')
+        self.cell_keys, self.cell_start, self.cell_count = np.unique(
+            keys[self.order], return_index=True, return_counts=True)
+
+    def query(self, pos, radius):
+        # Candidate pairs (query index, stored ball id) from the 3^dims cells
+        # around each query ball
+        coords = np.floor((pos - self.origin) / self.cell).astype(np.int64)
+        pairs_q, pairs_g = [], []
+        for offset in itertools.product((-1, 0, 1), repeat=self.dims):
+            c = coords + offset
+            inside = np.nonzero(np.all((c >= 0) & (c < self.shape), axis=1))[0]
+            if len(inside) == 0 or len(self.cell_keys) == 0:
+                continue
+            key = c[inside] @ self.strides
+            lo = np.searchsorted(self.cell_keys, key)
+            found = (lo < len(self.cell_keys)) & (self.cell_keys[np.minimum(lo, len(self.cell_keys) - 1)] == key)
+            q, slot = _expand(inside[found], self.cell_start[lo[found]], self.cell_count[lo[found]])
+            pairs_q.append(q)
+            pairs_g.append(self.ids[self.order[slot]])
+        if not pairs_q:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate(pairs_q), np.concatenate(pairs_g)
+
+def sweep_and_prune_pairs(pos, radius, axis=None):
+    # Sort interval starts along the axis with the widest spread; each ball pairs
+    # with the following balls whose interval starts before its own ends. The
+    # other axes are then pruned with a bounding box test.
+    n = len(pos)
+    if n < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if axis is None:
+        axis = int(np.argmax(pos.var(axis=0)))
+    lo = pos[:, axis] - radius
+    hi = pos[:, axis] + radius
+    order = np.argsort(lo, kind='stable')
+    end = np.searchsorted(lo[order], hi[order], 'right')
+    first = np.arange(n)
+    a, b = _expand(first, first + 1, np.maximum(end - first - 1, 0))
+    a, b = order[a], order[b]
+
+    reach = radius[a] + radius[b]
+    keep = np.ones(len(a), dtype=bool)
+    for other in range(pos.shape[1]):
+        if other != axis:
+            keep &= np.abs(pos[a, other] - pos[b, other]) <= reach
+    return a[keep], b[keep]
+
+def all_pairs(pos, radius):
+    i, j = np.triu_indices(len(pos), k=1)
+    return i, j
+
+BROAD_PHASES = {
+    "grid": grid_pairs,
+    "sap": sweep_and_prune_pairs,
+    "all": all_pairs,
+}
@@ -0,0 +1,112 @@
+import math
+import numpy as np
+
+# Orbit camera for the 3D demo. The rotation (about x, then y), the
+# perspective divide and the move to screen coordinates are folded into one
+# 4x4 view-projection matrix, built once per frame. Any number of points is
+# then projected with a single matmul:
+#
+#   [sx w, sy w, depth, w] = M @ [x, y, z, 1],   w = (view_distance + depth) / view_distance
+#
+# where depth is the rotated z (larger is further away) and 1 / w is the
+# scale that a radius at that depth is drawn with.
+
+class Camera:
+    def __init__(self, width, height, view_distance, angle_x=0.0, angle_y=0.0):
+        self.width = width
+        self.height = height
+        self.view_distance = view_distance
+        self.angle_x = angle_x
+        self.angle_y = angle_y
+        self.matrix = None
+        self.update()
+
+    def rotate(self, dx, dy):
+        self.angle_x += dx
+        self.angle_y += dy
+
+    def update(self):
+        # Rebuild the view-projection matrix from the current angles
+        cx, sx = math.cos(self.angle_x), math.sin(self.angle_x)
+        cy, sy = math.cos(self.angle_y), math.sin(self.angle_y)
+        rot_x = np.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]])
+        rot_y = np.array([[cy, 0, -sy], [0, 1, 0], [sy, 0, cy]])
+        rot = rot_y @ rot_x
+
+        m = np.zeros((4, 4))
+        m[3, :3] = rot[2] / self.view_distance
+        m[3, 3] = 1.0
+        # Screen y points down; the screen center is added before the divide
+        m[0, :3] = rot[0]
+        m[1, :3] = -rot[1]
+        m[:2] += np.outer((self.width // 2, self.height // 2), m[3])
+        m[2, :3] = rot[2]
+        self.matrix = m
+        return m
+
+    def project(self, points):
+        # (..., 3) world points -> (..., 2) screen points, (...) depths and
+        # (...) radius scales, all in one pass
+        points = np.asarray(points, dtype=np.float64)
+        m = self.matrix
+        h = points @ m[:, :3].T + m[:, 3]
+        scale = 1.0 / h[..., 3]
+        return h[..., :2] * scale[..., None], h[..., 2], scale
+
+# Side of a PickGrid cell in pixels
+PICK_CELL = 32
+
+class PickGrid:
+    # The balls' projected circles from the last drawn frame, bucketed into
+    # square screen cells. Each cell lists the circles touching it front to
+    # back, so a pick only tests the few circles in the cursor's cell and
+    # returns the nearest one under it.
+    def __init__(self, width, height, cell=PICK_CELL):
+        self.cell = cell
+        self.cols = -(-width // cell)
+        self.rows = -(-height // cell)
+        self.centers = np.zeros((0, 2))
+        self.radii = np.zeros(0)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.entries = np.zeros(0, dtype=np.int64)
+        self.start = np.zeros(self.cols * self.rows + 1, dtype=np.int64)
+
+    def build(self, centers, radii, depth, ids=None):
+        # centers (n, 2) and radii (n,) in pixels; smaller depth is in front
+        n = len(centers)
+        self.centers, self.radii = centers, radii
+        ids = np.arange(n) if ids is None else np.asarray(ids)
+        # Range of cells each circle's bounding box covers, clipped to the screen
+        lo = np.floor((centers - radii[:, None]) / self.cell).astype(np.int64)
+        hi = np.floor((centers + radii[:, None]) / self.cell).astype(np.int64)
+        lo = np.maximum(lo, 0)
+        hi = np.minimum(hi, (self.cols - 1, self.rows - 1))
+        span = np.maximum(hi - lo + 1, 0)
+        counts = span[:, 0] * span[:, 1]
+
+        # One (cell, circle) entry per covered cell, without a Python loop
+        circle = np.repeat(np.arange(n), counts)
+        slot = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        width = span[circle, 0]
+        col = lo[circle, 0] + slot % width
+        row = lo[circle, 1] + slot // width
+        keys = row * self.cols + col
+
+        # By cell, then front to back within a cell
+        order = np.lexsort((depth[circle], keys))
+        self.entries = circle[order]
+        self.ids = ids
+        self.start = np.searchsorted(keys[order], np.arange(self.cols * self.rows + 1))
+
+    def pick(self, x, y):
+        # Id of the front-most circle containing (x, y), or None
+        col, row = int(x // self.cell), int(y // self.cell)
+        if not (0 <= col < self.cols and 0 <= row < self.rows):
+            return None
+        key = row * self.cols + col
+        candidates = self.entries[self.start[key]:self.start[key + 1]]
+        if len(candidates) == 0:
+            return None
+        d = self.centers[candidates] - (x, y)
+        inside = np.nonzero(np.einsum('ij,ij->i', d, d) < self.radii[candidates] ** 2)[0]
+        return int(self.ids[candidates[inside[0]]]) if len(inside) else None
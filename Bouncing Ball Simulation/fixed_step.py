@@ -0,0 +1,47 @@
+import math
+
+# Fixed-timestep driver shared by the bouncing demos. Physics advances in ticks
+# of dt = 1 (the size of one step in the original one-step-per-frame loops) at
+# `rate` ticks per second of wall-clock time, independent of the frame rate.
+# A tick is split into several substeps when the fastest ball would otherwise
+# move more than `max_travel` in one go, and the leftover fraction of a tick is
+# returned so renderers can interpolate between the previous and current state.
+class FixedStepper:
+    def __init__(self, step, rate=60.0, max_speed=None, max_travel=None, max_substeps=8,
+                 max_frame_time=0.25, begin_tick=None):
+        self.step = step
+        self.rate = rate
+        self.tick_time = 1.0 / rate
+        self.max_speed = max_speed
+        self.max_travel = max_travel
+        self.max_substeps = max_substeps
+        # Longest frame time accepted, so a stall can't queue up endless ticks
+        self.max_frame_time = max_frame_time
+        self.begin_tick = begin_tick
+        self.accumulator = 0.0
+        self.ticks = 0
+
+    def substeps(self):
+        if self.max_speed is None or self.max_travel is None:
+            return 1
+        travel = self.max_travel() if callable(self.max_travel) else self.max_travel
+        if travel <= 0:
+            return 1
+        return min(self.max_substeps, max(1, math.ceil(self.max_speed() / travel)))
+
+    def advance(self, frame_time):
+        # Run every whole tick that fits into the elapsed time; returns the
+        # interpolation factor in [0, 1) for rendering
+        self.accumulator += min(frame_time, self.max_frame_time)
+        while self.accumulator >= self.tick_time:
+            if self.begin_tick is not None:
+                self.begin_tick()
+            n = self.substeps()
+            for _ in range(n):
+                self.step(1.0 / n)
+            self.accumulator -= self.tick_time
+            self.ticks += 1
+        return self.accumulator / self.tick_time
+
+def lerp(previous, current, alpha):
+    return previous + (current - previous) * alpha
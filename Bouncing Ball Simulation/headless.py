@@ -0,0 +1,181 @@
+import argparse
+import hashlib
+import json
+import time
+import numpy as np
+
+from ball_world import BallWorld, MATERIALS
+from event_world import EventWorld
+from parallel_world import ParallelWorld
+from reference_engine import ReferenceWorld
+
+# Headless runner for the 2D and 3D ball worlds: no window, no frame limit.
+# The starting scene comes from a seeded generator, so a (dims, seed, balls)
+# triple always describes the same run, and the final state is hashed so that
+# optimized engines can be checked against the scalar reference engine.
+#
+# Without ball collisions the vector engine reproduces the reference bit for
+# bit. With collisions the two resolve contacts in a different order (all at
+# once vs. one pair at a time), so the checksums differ and --compare reports
+# how far the final positions drifted apart instead. The parallel engine sums
+# each ball's contacts in a different order than the vector engine, so with
+# collisions those two can also differ in the last bits (which a dense pile
+# amplifies into visible drift within about 100 steps). The event-driven
+# engine solves impacts exactly rather than by stepping, so it only agrees
+# with the others statistically.
+
+SCENES = {
+    # Same box, gravity and materials as 2dBouncing2nd.py
+    2: {"lo": (0, 0), "hi": (800, 600), "gravity": (0, 0.5), "materials": MATERIALS,
+        "radius": (15, 30), "speed": ((-5, 5), (-5, 0))},
+    # Same box, gravity and material as 3dBouncing.py
+    3: {"lo": (-150, -150, -150), "hi": (150, 150, 150), "gravity": (0, -0.5, 0),
+        "materials": {"default": {"elasticity": 0.8, "friction": 1.0, "color": (255, 255, 255)}},
+        "radius": (20, 30), "speed": ((-3, 3), (-3, 3), (-3, 3))},
+}
+# Above this many balls the default radius drops to the demos' small batch size
+SMALL_LIMIT = 100
+SMALL_RADIUS = (2, 5)
+ENGINES = ("vector", "parallel", "event", "reference")
+# --gas: no gravity and only glass balls in a box GAS_SCALE times the demo's,
+# the sparse bouncy case the event engine is made for. Measured over 600 steps
+# against the vector engine: 3.2-5.1x as fast for 100-200 balls at scale 4,
+# 1.1-1.7x at scale 2, but slower in the demo's box (0.4-0.9x) and for 500
+# balls below scale 4, where its all-pairs prediction dominates.
+GAS_MATERIAL = "glass"
+GAS_SCALE = 4.0
+
+def scene_box(dims, scale=1.0):
+    scene = SCENES[dims]
+    return np.array(scene["lo"], dtype=np.float64) * scale, np.array(scene["hi"], dtype=np.float64) * scale
+
+def gas_scene(dims):
+    scene = dict(SCENES[dims])
+    scene["gravity"] = (0,) * dims
+    scene["materials"] = {GAS_MATERIAL: MATERIALS[GAS_MATERIAL]}
+    return scene
+
+def initial_state(dims, count, seed, radius_range=None, scale=1.0, gas=False):
+    scene = gas_scene(dims) if gas else SCENES[dims]
+    if radius_range is None:
+        radius_range = scene["radius"] if count <= SMALL_LIMIT else SMALL_RADIUS
+    rng = np.random.default_rng(seed)
+    lo, hi = scene_box(dims, scale)
+    radius = rng.integers(radius_range[0], radius_range[1] + 1, count).astype(np.float64)
+    pos = rng.uniform(lo + radius[:, None], hi - radius[:, None], (count, dims))
+    speed = np.array(scene["speed"], dtype=np.float64)
+    vel = rng.uniform(speed[:, 0], speed[:, 1], (count, dims))
+    material = rng.integers(0, len(scene["materials"]), count)
+    return pos, vel, radius, material
+
+def make_engine(name, dims, pos, vel, radius, material, collisions=True, broad_phase="grid",
+                scale=1.0, workers=None, sleeping=False, ccd=False, gas=False):
+    scene = gas_scene(dims) if gas else SCENES[dims]
+    lo, hi = scene_box(dims, scale)
+    if name == "reference":
+        world = ReferenceWorld(lo, hi, scene["gravity"], pos, vel, radius, material, scene["materials"])
+    elif name == "event":
+        world = EventWorld(lo, hi, scene["gravity"], pos, vel, radius, material, scene["materials"])
+    elif name == "parallel":
+        world = ParallelWorld(lo, hi, scene["gravity"], pos, vel, radius, material, scene["materials"],
+                              workers, collisions)
+    else:
+        world = BallWorld(lo, hi, scene["gravity"], scene["materials"], capacity=len(pos))
+        world.add(pos, vel, radius, material)
+        world.broad_phase = broad_phase
+        world.sleeping = sleeping
+        world.ccd = ccd
+    world.collisions = collisions
+    return world
+
+def final_state(world):
+    if isinstance(world, (BallWorld, ParallelWorld, EventWorld)):
+        pos, vel, radius, material = world.state()
+        return np.array(pos), np.array(vel)
+    pos, vel = world.state()
+    return np.array(pos, dtype=np.float64), np.array(vel, dtype=np.float64)
+
+def checksum(pos, vel):
+    # Hash of the raw float64 bytes: equal only for bit-identical states
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(pos, dtype='<f8').tobytes())
+    digest.update(np.ascontiguousarray(vel, dtype='<f8').tobytes())
+    return digest.hexdigest()
+
+def run(world, steps):
+    contacts = 0
+    start = time.perf_counter()
+    for _ in range(steps):
+        contacts += world.step()
+    elapsed = time.perf_counter() - start
+    return elapsed, contacts
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ball simulation headless and report throughput")
+    parser.add_argument("--dims", type=int, default=2, choices=(2, 3))
+    parser.add_argument("--balls", type=int, default=1000)
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--radius", type=int, nargs=2, default=None, metavar=("MIN", "MAX"))
+    parser.add_argument("--scale", type=float, default=None,
+                        help=f"box size relative to the demo's (default 1, or {GAS_SCALE:g} with --gas)")
+    parser.add_argument("--engine", choices=ENGINES, default="vector")
+    parser.add_argument("--workers", type=int, default=None, help="processes for the parallel engine")
+    parser.add_argument("--broad-phase", choices=("grid", "sap", "all"), default="grid")
+    parser.add_argument("--no-collisions", action="store_true", help="gravity and walls only")
+    parser.add_argument("--sleep", action="store_true", help="let settled balls sleep (vector engine)")
+    parser.add_argument("--ccd", action="store_true", help="continuous collision detection (vector engine)")
+    parser.add_argument("--gas", action="store_true",
+                        help=f"no gravity, glass balls only, in a sparse {GAS_SCALE:g}x box")
+    parser.add_argument("--compare", nargs="?", const="reference", choices=ENGINES,
+                        help="also run another engine (default: reference) and compare")
+    parser.add_argument("--output", help="write the results and checksum as JSON")
+    args = parser.parse_args()
+    if args.scale is None:
+        args.scale = GAS_SCALE if args.gas else 1.0
+
+    state = initial_state(args.dims, args.balls, args.seed, args.radius, args.scale, args.gas)
+    engines = [args.engine]
+    if args.compare and args.compare != args.engine:
+        engines.append(args.compare)
+
+    print(f"{'engine':>10} {'balls':>8} {'steps':>7} {'steps/s':>10} {'collisions/s':>13}  checksum")
+    results = {}
+    for name in engines:
+        world = make_engine(name, args.dims, *state, not args.no_collisions, args.broad_phase,
+                            args.scale, args.workers, args.sleep, args.ccd, args.gas)
+        elapsed, contacts = run(world, args.steps)
+        pos, vel = final_state(world)
+        if name == "parallel":
+            pos, vel = pos.copy(), vel.copy()
+            world.close()
+        digest = checksum(pos, vel)
+        results[name] = {
+            "steps_per_sec": args.steps / elapsed,
+            "collisions_per_sec": contacts / elapsed,
+            "collisions": contacts,
+            "seconds": elapsed,
+            "checksum": digest,
+        }
+        print(f"{name:>10} {args.balls:>8} {args.steps:>7} {args.steps / elapsed:>10.1f} "
+              f"{contacts / elapsed:>13.1f}  {digest[:16]}")
+        results[name]["pos"] = pos
+
+    if len(engines) == 2:
+        first, second = results[engines[0]], results[engines[1]]
+        drift = float(np.abs(first["pos"] - second["pos"]).max(initial=0))
+        same = first["checksum"] == second["checksum"]
+        print(f"checksums {'match' if same else 'differ'}, max position difference {drift:.6g}, "
+              f"{engines[0]} is {second['seconds'] / first['seconds']:.2f}x as fast as {engines[1]}")
+
+    if args.output:
+        report = {
+            "dims": args.dims, "balls": args.balls, "steps": args.steps, "seed": args.seed, "scale": args.scale,
+            "collisions": not args.no_collisions, "broad_phase": args.broad_phase, "sleep": args.sleep, "ccd": args.ccd, "gas": args.gas,
+            "engines": {name: {k: v for k, v in r.items() if k != "pos"} for name, r in results.items()},
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import multiprocessing as mp
+import os
+import numpy as np
+from multiprocessing import shared_memory
+
+from ball_world import MATERIALS, MaterialTable, wall_response, resolve_pairs
+from broad_phase import grid_pairs
+
+# Multi-process version of BallWorld for very large ball counts. Ball state
+# lives in one shared memory block, and the box is cut into slabs along x, one
+# per worker process. A ball belongs to the slab its center is in. Every step:
+#
+#   1. each worker integrates and bounces its own balls off the walls
+#   2. (barrier) each worker copies its slab plus a ghost region on either
+#      side, as wide as the largest possible contact distance, finds and
+#      resolves contacts on the copy, and keeps the new state of its own balls
+#   3. (barrier) each worker writes its own balls back
+#
+# Between the barriers the shared arrays are only read, so a pair across a slab
+# border is resolved on both sides from the same state and each side keeps its
+# half. The slab borders are moved to x quantiles every few steps so workers
+# get similar ball counts.
+
+class ParallelWorld:
+    def __init__(self, lo, hi, gravity, pos, vel, radius, material, materials=MATERIALS,
+                 workers=None, collisions=True, rebalance_every=10):
+        self.lo = np.asarray(lo, dtype=np.float64)
+        self.hi = np.asarray(hi, dtype=np.float64)
+        self.dims = len(self.lo)
+        self.gravity = np.asarray(gravity, dtype=np.float64)
+        self.workers = workers or os.cpu_count()
+        self.count = len(pos)
+        self.rebalance_every = rebalance_every
+        self._since_rebalance = None
+
+        self.layout, size = _layout(self.count, self.dims, self.workers)
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.arrays = _views(self.shm, self.layout)
+        self.arrays["pos"][:] = pos
+        self.arrays["vel"][:] = vel
+        self.arrays["radius"][:] = radius
+        self.arrays["material"][:] = material
+        self.arrays["control"][:] = (0, int(collisions))
+
+        # `sync` brackets each batch of steps with the main process; `phase`
+        # separates the read and write phases between the workers only
+        self.sync = mp.Barrier(self.workers + 1)
+        self.phase = mp.Barrier(self.workers)
+        self.rebalance()
+        self.procs = [mp.Process(target=_worker_main, daemon=True,
+                                 args=(k, self.shm.name, self.layout, self.lo, self.hi, self.gravity,
+                                       materials, self.sync, self.phase))
+                      for k in range(self.workers)]
+        for proc in self.procs:
+            proc.start()
+
+    @property
+    def collisions(self):
+        return bool(self.arrays["control"][1])
+
+    @collisions.setter
+    def collisions(self, value):
+        self.arrays["control"][1] = int(value)
+
+    def rebalance(self):
+        # Slab borders at x quantiles; the outer borders are open so balls
+        # pushed slightly past the walls still have an owner
+        bounds = self.arrays["bounds"]
+        bounds[0], bounds[-1] = -np.inf, np.inf
+        if self.count:
+            bounds[1:-1] = np.quantile(self.arrays["pos"][:, 0], np.arange(1, self.workers) / self.workers)
+        self._since_rebalance = 0
+
+    def step(self, steps=1):
+        # Run `steps` steps on the workers; returns the number of contacts
+        if self._since_rebalance >= self.rebalance_every:
+            self.rebalance()
+        control = self.arrays["control"]
+        control[0] = steps
+        self.sync.wait()
+        self.sync.wait()
+        self._since_rebalance += steps
+        return int(self.arrays["contacts"].sum())
+
+    def state(self):
+        return self.arrays["pos"], self.arrays["vel"], self.arrays["radius"], self.arrays["material"]
+
+    def close(self):
+        if self.procs:
+            self.arrays["control"][0] = 0
+            self.sync.wait()
+            for proc in self.procs:
+                proc.join()
+            self.procs = []
+            self.arrays = None
+            self.shm.close()
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _layout(count, dims, workers):
+    # Offsets of every array inside the shared block
+    fields = [("pos", np.float64, (count, dims)), ("vel", np.float64, (count, dims)),
+              ("radius", np.float64, (count,)), ("material", np.int32, (count,)),
+              ("bounds", np.float64, (workers + 1,)), ("contacts", np.int64, (workers,)),
+              ("control", np.int64, (2,))]
+    layout, offset = {}, 0
+    for name, dtype, shape in fields:
+        offset = (offset + 7) // 8 * 8
+        layout[name] = (offset, np.dtype(dtype).str, shape)
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return layout, max(offset, 1)
+
+def _views(shm, layout):
+    return {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            for name, (offset, dtype, shape) in layout.items()}
+
+def _owned(pos, bounds, k):
+    x = pos[:, 0]
+    return np.nonzero((x >= bounds[k]) & (x < bounds[k + 1]))[0]
+
+def _worker_main(k, shm_name, layout, lo, hi, gravity, materials, sync, phase):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        arrays = _views(shm, layout)
+        _worker_loop(k, arrays, lo, hi, gravity, MaterialTable(materials), sync, phase)
+    except Exception:
+        # Don't leave the other processes waiting on a barrier forever
+        sync.abort()
+        phase.abort()
+        raise
+    finally:
+        arrays = None
+        shm.close()
+
+def _worker_loop(k, arrays, lo, hi, gravity, materials, sync, phase):
+    pos, vel, radius, material = arrays["pos"], arrays["vel"], arrays["radius"], arrays["material"]
+    bounds, contacts, control = arrays["bounds"], arrays["contacts"], arrays["control"]
+    # Two balls can touch when their centers are up to two radii apart
+    reach = 2 * float(radius.max()) if len(radius) else 0.0
+    while True:
+        sync.wait()
+        steps, collisions = int(control[0]), bool(control[1])
+        if steps == 0:
+            return
+        contacts[k] = 0
+        own = _owned(pos, bounds, k)
+        # Nobody may move a ball until every worker has picked its own
+        phase.wait()
+        for _ in range(steps):
+            # 1. Gravity, integration and walls for this slab's balls
+            p, v = pos[own], vel[own]
+            v += gravity
+            p += v
+            wall_response(p, v, radius[own], material[own], materials, lo, hi)
+            pos[own], vel[own] = p, v
+            phase.wait()
+
+            # 2. Contacts on a private copy of the slab and its ghost regions
+            own = _owned(pos, bounds, k)
+            if collisions:
+                x = pos[:, 0]
+                local = np.nonzero((x >= bounds[k] - reach) & (x < bounds[k + 1] + reach))[0]
+                mine = (x[local] >= bounds[k]) & (x[local] < bounds[k + 1])
+                p, v, r, m = pos[local], vel[local], radius[local], material[local]
+                i, j = grid_pairs(p, r)
+                keep = mine[i] | mine[j]
+                i, j = i[keep], j[keep]
+                contacts[k] += _counted(p, r, i, j, local, mine)
+                resolve_pairs(p, v, r, m, materials, i, j)
+                # Same clamp as BallWorld.step: contact pushes never leave the box
+                np.clip(p, lo + r[:, None], hi - r[:, None], out=p)
+                p, v = p[mine], v[mine]
+            phase.wait()
+
+            # 3. Write this slab's balls back
+            if collisions:
+                pos[own], vel[own] = p, v
+        sync.wait()
+
+def _counted(pos, radius, i, j, local, mine):
+    # Contacts across a slab border are resolved on both sides; count each one
+    # only in the slab that owns the lower-numbered ball
+    d = pos[i] - pos[j]
+    touching = np.sqrt(np.einsum('ij,ij->i', d, d)) < radius[i] + radius[j]
+    first = np.where(local[i] < local[j], i, j)
+    return int(np.count_nonzero(touching & mine[first]))
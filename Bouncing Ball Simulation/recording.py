@@ -0,0 +1,157 @@
+import json
+import struct
+import zlib
+import numpy as np
+
+# Record/replay of ball world runs. A recording is one file:
+#
+#   magic, header length, JSON header (dims, box, tick rate, seed, ...)
+#   chunk, chunk, ...
+#   chunk index, footer
+#
+# A chunk holds up to `chunk_frames` consecutive ticks of the same set of
+# balls: their radii once, every tick's positions and velocities as
+# float32, then their colours, all zlib-compressed together. Each chunk is a
+# keyframe (it decodes on its own), and a new one starts whenever the balls'
+# radii or colours change. The index at the end lists every chunk's first
+# frame and file offset, so seeking to a frame is one index lookup and one
+# chunk decompress, however long the run. Every chunk also starts with its
+# own small header, so a file whose recorder never got closed can still be
+# read by scanning the chunks.
+
+MAGIC = b"BALLREC1"
+CHUNK_HEADER = struct.Struct("<qiiiq")  # first frame, frames, balls, dims, compressed size
+FOOTER = struct.Struct("<qq8s")  # index offset, chunks, magic
+CHUNK_FRAMES = 64
+
+class Recorder:
+    def __init__(self, path, world, rate, seed=None, chunk_frames=CHUNK_FRAMES, level=1, **extra):
+        self.file = open(path, "wb")
+        self.dims = world.dims
+        self.chunk_frames = chunk_frames
+        self.level = level
+        header = {"dims": world.dims, "lo": world.lo.tolist(), "hi": world.hi.tolist(),
+                  "rate": rate, "seed": seed, **extra}
+        data = json.dumps(header).encode()
+        self.file.write(MAGIC + struct.pack("<i", len(data)) + data)
+        self.index = []
+        self.frames = 0
+        self._balls = None  # (radius, color) of the chunk being filled
+        self._pos, self._vel = [], []
+
+    def append(self, world):
+        # Record the world's current state as the next frame
+        n = world.count
+        radius, color = world.radius[:n], world.color[:n]
+        # A chunk stores radii and colours once, so a change in either (balls
+        # added, removed or replaced by others of the same size) starts a new one
+        if (self._balls is None or len(self._pos) >= self.chunk_frames
+                or not np.array_equal(self._balls[0], radius)
+                or not np.array_equal(self._balls[1], color)):
+            self.flush()
+            # Kept in the world's dtype so the comparison above sees real changes
+            # only; it becomes float32 when the chunk is written
+            self._balls = (radius.copy(), color.copy())
+        self._pos.append(world.pos[:n].astype(np.float32))
+        self._vel.append(world.vel[:n].astype(np.float32))
+        self.frames += 1
+
+    def flush(self):
+        if not self._pos:
+            return
+        radius, color = self._balls
+        frames = len(self._pos)
+        # Colours go last so the float32 arrays stay aligned when decoded
+        payload = zlib.compress(b"".join((radius.astype(np.float32).tobytes(), np.stack(self._pos).tobytes(),
+                                          np.stack(self._vel).tobytes(), color.tobytes())),
+                                self.level)
+        first = self.frames - frames
+        self.index.append((first, self.file.tell()))
+        self.file.write(CHUNK_HEADER.pack(first, frames, len(radius), self.dims, len(payload)))
+        self.file.write(payload)
+        self._pos, self._vel = [], []
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        offset = self.file.tell()
+        self.file.write(np.array(self.index, dtype="<i8").reshape(-1, 2).tobytes())
+        self.file.write(FOOTER.pack(offset, len(self.index), MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Recording:
+    # Random access to a recording: frame(k) -> (pos, vel, radius, color).
+    # The last decoded chunk is kept, so playing forward decompresses each
+    # chunk once.
+    def __init__(self, path):
+        self.data = np.memmap(path, dtype=np.uint8, mode="r")
+        raw = self.data
+        if bytes(raw[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path} is not a ball recording")
+        length = struct.unpack_from("<i", raw, len(MAGIC))[0]
+        start = len(MAGIC) + 4
+        self.header = json.loads(bytes(raw[start:start + length]))
+        self.dims = self.header["dims"]
+        self.rate = self.header["rate"]
+        self._first_chunk = start + length
+
+        tail = bytes(raw[-FOOTER.size:]) if len(raw) - self._first_chunk >= FOOTER.size else b""
+        if tail[-len(MAGIC):] == MAGIC:
+            offset, chunks, _ = FOOTER.unpack(tail)
+            index = np.frombuffer(raw, dtype="<i8", count=2 * chunks, offset=offset).reshape(-1, 2)
+        else:
+            index = self._scan()
+        self.starts, self.offsets = index[:, 0].copy(), index[:, 1].copy()
+        if len(self.offsets):
+            first, frames = CHUNK_HEADER.unpack_from(raw, int(self.offsets[-1]))[:2]
+            self.frames = first + frames
+        else:
+            self.frames = 0
+        self._cached = None
+
+    def _scan(self):
+        # Rebuild the index of an unclosed file from the chunk headers
+        raw, offset, index = self.data, self._first_chunk, []
+        while offset + CHUNK_HEADER.size <= len(raw):
+            first, frames, balls, dims, size = CHUNK_HEADER.unpack_from(raw, offset)
+            if offset + CHUNK_HEADER.size + size > len(raw):
+                break
+            index.append((first, offset))
+            offset += CHUNK_HEADER.size + size
+        return np.array(index, dtype=np.int64).reshape(-1, 2)
+
+    def __len__(self):
+        return self.frames
+
+    def chunk(self, c):
+        if self._cached is not None and self._cached[0] == c:
+            return self._cached[1]
+        offset = int(self.offsets[c])
+        first, frames, balls, dims, size = CHUNK_HEADER.unpack_from(self.data, offset)
+        start = offset + CHUNK_HEADER.size
+        raw = zlib.decompress(self.data[start:start + size])
+        radius = np.frombuffer(raw, np.float32, balls)
+        states = np.frombuffer(raw, np.float32, 2 * frames * balls * dims, radius.nbytes)
+        pos, vel = states.reshape(2, frames, balls, dims)
+        color = np.frombuffer(raw, np.uint8, balls * 3, radius.nbytes + states.nbytes).reshape(balls, 3)
+        decoded = (first, pos, vel, radius, color)
+        self._cached = (c, decoded)
+        return decoded
+
+    def frame(self, k):
+        if not 0 <= k < self.frames:
+            raise IndexError(k)
+        c = int(np.searchsorted(self.starts, k, side="right")) - 1
+        first, pos, vel, radius, color = self.chunk(c)
+        return pos[k - first], vel[k - first], radius, color
+
+    def close(self):
+        self._cached = None
+        self.data = None
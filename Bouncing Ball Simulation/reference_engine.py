@@ -0,0 +1,80 @@
+import math
+from ball_world import MATERIALS
+
+# Scalar reference physics: one Python object per ball, updated one at a time
+# exactly like the original Ball / Ball3D classes and check_collision loop.
+# Slow, but simple enough to trust; optimized engines are checked against it
+# (see headless.py). Works in 2D or 3D depending on the length of the bounds.
+
+class ReferenceBall:
+    def __init__(self, pos, vel, radius, elasticity, friction):
+        self.pos = [float(v) for v in pos]
+        self.vel = [float(v) for v in vel]
+        self.radius = float(radius)
+        self.elasticity = elasticity
+        self.friction = friction
+
+    def update(self, gravity, lo, hi):
+        # Apply gravity and update position
+        for axis in range(len(self.pos)):
+            self.vel[axis] += gravity[axis]
+            self.pos[axis] += self.vel[axis]
+
+        # Collision with walls, one axis at a time
+        r = self.radius
+        for axis in range(len(self.pos)):
+            if self.pos[axis] - r < lo[axis]:
+                self.pos[axis] = lo[axis] + r
+            elif self.pos[axis] + r > hi[axis]:
+                self.pos[axis] = hi[axis] - r
+            else:
+                continue
+            self.vel[axis] = -self.vel[axis] * self.elasticity
+            for other in range(len(self.vel)):
+                if other != axis:
+                    self.vel[other] *= self.friction
+
+def check_collision(ball1, ball2):
+    d = [a - b for a, b in zip(ball1.pos, ball2.pos)]
+    distance = math.sqrt(sum(c * c for c in d))
+    if distance >= ball1.radius + ball2.radius:
+        return False
+
+    # Move balls apart along the line between the centers
+    normal = [c / distance for c in d] if distance > 0 else [1.0] + [0.0] * (len(d) - 1)
+    overlap = (ball1.radius + ball2.radius - distance) / 2
+    for axis in range(len(d)):
+        ball1.pos[axis] += overlap * normal[axis]
+        ball2.pos[axis] -= overlap * normal[axis]
+
+    # Exchange velocities (simplified physics)
+    total_elasticity = (ball1.elasticity + ball2.elasticity) / 2
+    total_friction = (ball1.friction + ball2.friction) / 2
+    ball1.vel, ball2.vel = ([v * total_elasticity * total_friction for v in ball2.vel],
+                            [v * total_elasticity * total_friction for v in ball1.vel])
+    return True
+
+class ReferenceWorld:
+    def __init__(self, lo, hi, gravity, pos, vel, radius, material, materials=MATERIALS):
+        self.lo = [float(v) for v in lo]
+        self.hi = [float(v) for v in hi]
+        self.gravity = [float(v) for v in gravity]
+        self.collisions = True
+        props = list(materials.values())
+        self.balls = [ReferenceBall(p, v, r, props[m]["elasticity"], props[m]["friction"])
+                      for p, v, r, m in zip(pos.tolist(), vel.tolist(), radius.tolist(), material.tolist())]
+
+    def step(self):
+        # Returns the number of ball-ball contacts resolved this step
+        for ball in self.balls:
+            ball.update(self.gravity, self.lo, self.hi)
+        contacts = 0
+        if self.collisions:
+            balls = self.balls
+            for i in range(len(balls)):
+                for j in range(i + 1, len(balls)):
+                    contacts += check_collision(balls[i], balls[j])
+        return contacts
+
+    def state(self):
+        return [b.pos for b in self.balls], [b.vel for b in self.balls]
@@ -0,0 +1,120 @@
+import argparse
+import sys
+import numpy as np
+import pygame
+from ball_render import SpriteCache, GlyphCache
+from camera import Camera
+from recording import Recording
+
+# Replay viewer for recordings made with --record by 2dBouncing2nd.py or
+# 3dBouncing.py. Frames are read straight from the file, so seeking anywhere
+# is instant and playback can run at any speed without re-simulating.
+
+WIDTH, HEIGHT = 800, 600
+FPS = 60
+VIEW_DISTANCE = 800
+BAR_HEIGHT = 8
+BACKGROUND_COLOR = (0, 0, 0)
+WHITE = (255, 255, 255)
+
+def draw_2d(surface, pos, radius, color, sprites):
+    # Same sprite cache as the 2D demo, with each distinct colour as a material
+    colors, ids = np.unique(color, axis=0, return_inverse=True)
+    if sprites is None or not np.array_equal(sprites.colors, colors):
+        sprites = SpriteCache(colors)
+    sprites.draw(surface, pos.astype(int), radius.astype(int), ids.reshape(-1))
+    return sprites
+
+def draw_3d(surface, pos, radius, color, camera, lo, hi):
+    corners = np.array([(x, y, z) for z in (lo[2], hi[2]) for x, y in
+                        ((lo[0], lo[1]), (hi[0], lo[1]), (hi[0], hi[1]), (lo[0], hi[1]))])
+    projected, depth, scale = camera.project(np.concatenate((corners, pos)))
+    box = projected[:8].tolist()
+    for a, b in ((0, 1), (1, 2), (2, 3), (3, 0), (4, 5), (5, 6), (6, 7), (7, 4),
+                 (0, 4), (1, 5), (2, 6), (3, 7)):
+        pygame.draw.line(surface, (100, 100, 100), box[a], box[b])
+    order = np.argsort(-depth[8:], kind="stable")
+    centers = projected[8:][order].astype(int).tolist()
+    radii = (radius * scale[8:])[order].astype(int).tolist()
+    for c, r, col in zip(centers, radii, color[order].tolist()):
+        pygame.draw.circle(surface, col, c, r)
+
+def main():
+    parser = argparse.ArgumentParser(description="Play back a recorded ball simulation")
+    parser.add_argument("path")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed relative to real time")
+    args = parser.parse_args()
+
+    recording = Recording(args.path)
+    if len(recording) == 0:
+        sys.exit(f"{args.path} holds no frames")
+    lo, hi = np.array(recording.header["lo"]), np.array(recording.header["hi"])
+
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption(f"Replay: {args.path}")
+    clock = pygame.time.Clock()
+    glyphs = GlyphCache(pygame.font.SysFont('Arial', 16))
+    camera = Camera(WIDTH, HEIGHT, VIEW_DISTANCE)
+    sprites = None
+    rotating = False
+
+    frame, speed, playing = 0.0, args.speed, True
+    last = len(recording) - 1
+    running = True
+    while running:
+        frame_time = clock.tick(FPS) / 1000
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    playing = not playing
+                elif event.key == pygame.K_RIGHT:
+                    frame += recording.rate
+                elif event.key == pygame.K_LEFT:
+                    frame -= recording.rate
+                elif event.key == pygame.K_UP:
+                    speed *= 2
+                elif event.key == pygame.K_DOWN:
+                    speed /= 2
+                elif event.key == pygame.K_HOME:
+                    frame = 0
+                elif event.key == pygame.K_END:
+                    frame = last
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                if event.pos[1] >= HEIGHT - BAR_HEIGHT * 2:
+                    # Click on the progress bar to seek
+                    frame = event.pos[0] / WIDTH * last
+                else:
+                    rotating = True
+            elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
+                rotating = False
+            elif event.type == pygame.MOUSEMOTION and rotating:
+                camera.rotate(-event.rel[1] * 0.005, -event.rel[0] * 0.005)
+
+        if playing:
+            frame += frame_time * recording.rate * speed
+        frame = min(max(frame, 0), last)
+        pos, vel, radius, color = recording.frame(int(frame))
+
+        screen.fill(BACKGROUND_COLOR)
+        if recording.dims == 2:
+            sprites = draw_2d(screen, pos, radius, color, sprites)
+        else:
+            camera.update()
+            draw_3d(screen, pos, radius, color, camera, lo, hi)
+
+        pygame.draw.rect(screen, (60, 60, 60), (0, HEIGHT - BAR_HEIGHT, WIDTH, BAR_HEIGHT))
+        pygame.draw.rect(screen, WHITE, (0, HEIGHT - BAR_HEIGHT, int(WIDTH * frame / max(last, 1)), BAR_HEIGHT))
+        hud = ["Space: Pause  Left/Right: Seek 1s  Up/Down: Speed  Home/End: Start/End",
+               f"Frame {int(frame)}/{last}  Speed: {speed:g}x  Balls: {len(radius)}  "
+               f"{'Playing' if playing else 'Paused'}  FPS: {clock.get_fps():.0f}"]
+        screen.blits([(glyphs.get(text), (10, 10 + i * 20)) for i, text in enumerate(hud)], doreturn=False)
+        pygame.display.flip()
+
+    recording.close()
+    pygame.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+// Client side of stream_server.py: connects to the page's own host and keeps
+// the latest decoded frame. Pages opened with ?stream draw from it instead of
+// running their own physics. Every decoded frame is acknowledged, which is
+// what lets the server send more. See stream_server.py for the message layout.
+class BallStream {
+    constructor(onFrame) {
+        this.onFrame = onFrame;
+        this.dims = 2;
+        this.count = 0;
+        this.frame = 0;
+        this.lo = null;
+        this.hi = null;
+        this.radius = new Float32Array(0);
+        this.pos = new Float32Array(0);
+        this.color = new Uint8Array(0);
+        this.connected = false;
+        this.connect();
+    }
+
+    static requested() {
+        return new URLSearchParams(window.location.search).has('stream');
+    }
+
+    connect() {
+        const socket = new WebSocket(`ws://${window.location.host}/stream`);
+        socket.binaryType = 'arraybuffer';
+        socket.onopen = () => { this.connected = true; };
+        socket.onmessage = (e) => {
+            this.decode(e.data);
+            socket.send(new Uint32Array([this.frame]));
+        };
+        socket.onclose = () => {
+            // Try again shortly; the first frame after reconnecting is a keyframe
+            this.connected = false;
+            setTimeout(() => this.connect(), 1000);
+        };
+    }
+
+    decode(buffer) {
+        const view = new DataView(buffer);
+        const type = view.getUint8(0);
+        const dims = view.getUint8(1);
+        const n = view.getUint32(4, true);
+        this.frame = view.getUint32(8, true);
+        const quantum = view.getFloat32(12, true);
+        let offset = 16;
+        if (type === 0) {
+            // Keyframe: box, radii, positions and colours from scratch
+            this.dims = dims;
+            this.count = n;
+            this.lo = new Float32Array(buffer, offset, dims);
+            this.hi = new Float32Array(buffer, offset + dims * 4, dims);
+            offset += dims * 8;
+            this.radius = new Float32Array(buffer, offset, n);
+            offset += n * 4;
+            this.pos = new Float32Array(buffer.slice(offset, offset + n * dims * 4));
+            offset += n * dims * 4;
+            this.color = new Uint8Array(buffer, offset, n * 3);
+        } else {
+            // Delta: add the quantized steps to the positions we have
+            const steps = new Int16Array(buffer, offset, n * dims);
+            const pos = this.pos;
+            for (let i = 0; i < steps.length; i++) {
+                pos[i] += steps[i] * quantum;
+            }
+        }
+        if (this.onFrame) {
+            this.onFrame(this);
+        }
+    }
+}
+
+// Draw a streamed frame on a 2D canvas, scaling the server's box to the
+// canvas. One path per colour, so thousands of balls cost a few fills.
+function drawStream(ctx, stream, width, height) {
+    ctx.clearRect(0, 0, width, height);
+    if (!stream.lo) {
+        return;
+    }
+    const dims = stream.dims;
+    const sx = width / (stream.hi[0] - stream.lo[0]);
+    const sy = height / (stream.hi[1] - stream.lo[1]);
+    // 3D worlds have y up, the canvas has y down
+    const flip = dims === 3;
+    const paths = new Map();
+    for (let i = 0; i < stream.count; i++) {
+        const c = stream.color;
+        const key = (c[3 * i] << 16) | (c[3 * i + 1] << 8) | c[3 * i + 2];
+        let path = paths.get(key);
+        if (!path) {
+            path = new Path2D();
+            paths.set(key, path);
+        }
+        const x = (stream.pos[dims * i] - stream.lo[0]) * sx;
+        const y = flip ? (stream.hi[1] - stream.pos[dims * i + 1]) * sy : (stream.pos[dims * i + 1] - stream.lo[1]) * sy;
+        const r = stream.radius[i] * sx;
+        path.moveTo(x + r, y);
+        path.arc(x, y, r, 0, Math.PI * 2);
+    }
+    for (const [key, path] of paths) {
+        ctx.fillStyle = `rgb(${key >> 16}, ${(key >> 8) & 255}, ${key & 255})`;
+        ctx.fill(path);
+    }
+}
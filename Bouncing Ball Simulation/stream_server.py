@@ -0,0 +1,261 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import os
+import struct
+import time
+import numpy as np
+
+from fixed_step import FixedStepper
+from headless import initial_state, make_engine
+
+# Streams a headless ball world to the HTML pages over a localhost WebSocket.
+# The same port serves the pages themselves, so open e.g.
+# http://localhost:8765/index2.html?stream and the page draws the server's
+# balls instead of running its own physics. Any number of pages can watch the
+# one simulation.
+#
+# Frames are little-endian binary messages with a 16 byte header
+# (type u8, dims u8, unused u16, balls u32, frame u32, quantum f32):
+#
+#   KEYFRAME: box lo and hi f32[dims] each, radius f32[n], pos f32[n * dims],
+#             colour u8[n * 3]
+#   DELTA:    i16[n * dims], the change of every coordinate since the last
+#             frame this client got, in steps of `quantum`
+#
+# The server tracks each client's copy of the positions and encodes deltas
+# against it, so rounding never adds up. quantum is a power of two, so the
+# client's float32 sums come out exactly the same as the server's. A client
+# gets a keyframe when it connects, when balls are added or removed, when a
+# ball moved too far for an i16, and every KEYFRAME_EVERY frames.
+#
+# Clients acknowledge every frame they decode with a small message of their
+# own (stream.js sends the frame number as a u32), and the server has at most
+# IN_FLIGHT unacknowledged frames out to a client at a time. Socket buffers
+# can't serve as the limit: on localhost the kernel holds hundreds of frames
+# before a write blocks. Every client has a slot for the newest frame, not a
+# queue, so once its window is full a slow client skips the frames it
+# missed. It runs at the rate it can keep up with, a frame or two behind,
+# without slowing the simulation or the other clients.
+
+KEYFRAME, DELTA = 0, 1
+HEADER = struct.Struct("<BBHIIf")
+QUANTUM = 1 / 64
+KEYFRAME_EVERY = 300
+IN_FLIGHT = 2
+PAGES = {".html": "text/html", ".js": "text/javascript"}
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+class Snapshot:
+    # One simulation frame as sent to clients; `balls` changes whenever the
+    # set of balls does
+    def __init__(self, frame, balls, lo, hi, pos, radius, color):
+        self.frame, self.balls = frame, balls
+        self.lo, self.hi = lo, hi
+        self.pos, self.radius, self.color = pos, radius, color
+
+class ClientStream:
+    # Per-client encoder: what the client currently has, and whether the next
+    # frame can be a delta against it
+    def __init__(self):
+        self.base = None
+        self.balls = None
+        self.since_key = 0
+        self.sent = 0
+        self.acked = 0
+        self.skipped = 0
+        self.last_frame = None
+
+    def encode(self, snap):
+        dims = snap.pos.shape[1]
+        n = len(snap.pos)
+        if self.base is not None and snap.balls == self.balls and self.since_key < KEYFRAME_EVERY:
+            steps = np.rint((snap.pos - self.base) / np.float32(QUANTUM))
+            if n == 0 or np.abs(steps).max() <= 32767:
+                steps = steps.astype(np.int16)
+                self.base += steps * np.float32(QUANTUM)
+                self.since_key += 1
+                return HEADER.pack(DELTA, dims, 0, n, snap.frame, QUANTUM) + steps.tobytes()
+        self.base = snap.pos.copy()
+        self.balls = snap.balls
+        self.since_key = 0
+        return b"".join((HEADER.pack(KEYFRAME, dims, 0, n, snap.frame, QUANTUM),
+                         snap.lo.tobytes(), snap.hi.tobytes(), snap.radius.tobytes(),
+                         snap.pos.tobytes(), snap.color.tobytes()))
+
+class StreamServer:
+    def __init__(self, world, rate, directory):
+        self.world = world
+        self.rate = rate
+        self.directory = directory
+        self.frame = 0
+        self.balls = 0
+        self.latest = None
+        self.clients = set()
+        self._radius = None
+        self._changed = asyncio.Event()
+
+    def snapshot(self):
+        pos, vel, radius, material = self.world.state()
+        if self._radius is None or not np.array_equal(self._radius, radius):
+            self._radius = radius.copy()
+            self._color = self.world.color[:len(radius)].copy()
+            self.balls += 1
+        self.latest = Snapshot(self.frame, self.balls, self.world.lo.astype(np.float32),
+                               self.world.hi.astype(np.float32), pos.astype(np.float32),
+                               self._radius.astype(np.float32), self._color)
+        # Wake every client's sender; each picks up only the newest frame
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def simulate(self):
+        # Physics runs in a worker thread so the event loop stays free for
+        # clients; they only ever see the snapshots taken between ticks
+        loop = asyncio.get_running_loop()
+        stepper = FixedStepper(self.world.step, self.rate, self.world.max_speed, self.world.max_travel)
+        last = time.perf_counter()
+        self.snapshot()
+        while True:
+            now = time.perf_counter()
+            ticks = stepper.ticks
+            await loop.run_in_executor(None, stepper.advance, now - last)
+            last = now
+            if stepper.ticks != ticks:
+                self.frame = stepper.ticks
+                self.snapshot()
+            await asyncio.sleep(max(0.0, 1 / self.rate - (time.perf_counter() - now)))
+
+    async def handle(self, reader, writer):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+            lines = request.decode("latin-1").split("\r\n")
+            method, target = lines[0].split(" ")[:2]
+            headers = {k.strip().lower(): v.strip() for k, _, v in (l.partition(":") for l in lines[1:] if l)}
+            path = target.split("?")[0]
+            if headers.get("upgrade", "").lower() == "websocket":
+                await self.stream(reader, writer, headers)
+            else:
+                await self.serve_page(writer, path)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve_page(self, writer, path):
+        name = os.path.basename(path) or "index.html"
+        kind = PAGES.get(os.path.splitext(name)[1])
+        file = os.path.join(self.directory, name)
+        if kind is None or not os.path.isfile(file):
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        else:
+            with open(file, "rb") as f:
+                body = f.read()
+            writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: {kind}\r\nContent-Length: {len(body)}\r\n"
+                         f"Connection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def stream(self, reader, writer, headers):
+        accept = base64.b64encode(hashlib.sha1(headers["sec-websocket-key"].encode() + WS_GUID).digest())
+        writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+        await writer.drain()
+        client = ClientStream()
+        self.clients.add(client)
+        acked = asyncio.Event()
+
+        def ack(data):
+            client.acked += 1
+            acked.set()
+
+        receiver = asyncio.ensure_future(_read_frames(reader, writer, ack))
+        try:
+            while not receiver.done():
+                acked.clear()
+                snap = self.latest
+                if client.sent - client.acked >= IN_FLIGHT:
+                    event = acked
+                elif snap is None or snap.frame == client.last_frame:
+                    event = self._changed
+                else:
+                    event = None
+                if event is not None:
+                    waiter = asyncio.ensure_future(event.wait())
+                    await asyncio.wait((waiter, receiver), return_when=asyncio.FIRST_COMPLETED)
+                    waiter.cancel()
+                    continue
+                if client.last_frame is not None:
+                    client.skipped += max(0, snap.frame - client.last_frame - 1)
+                client.last_frame = snap.frame
+                writer.write(_frame(0x2, client.encode(snap)))
+                await writer.drain()
+                client.sent += 1
+        finally:
+            receiver.cancel()
+            self.clients.discard(client)
+
+    async def report(self, every=5.0):
+        while True:
+            await asyncio.sleep(every)
+            world = self.world
+            rates = ", ".join(f"{c.sent / max(c.sent + c.skipped, 1):.0%}" for c in self.clients)
+            print(f"frame {self.frame}, {world.count} balls, {len(self.clients)} clients"
+                  + (f" (share of frames delivered: {rates})" if rates else ""))
+
+def _frame(opcode, payload):
+    # Unmasked server-to-client WebSocket frame
+    n = len(payload)
+    if n < 126:
+        head = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 1 << 16:
+        head = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else:
+        head = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    return head + payload
+
+async def _read_frames(reader, writer, on_message):
+    # Client frames: answer pings, stop on close, pass text and binary
+    # messages (acknowledgements) to on_message
+    while True:
+        b0, b1 = await reader.readexactly(2)
+        opcode, n = b0 & 0x0F, b1 & 0x7F
+        if n == 126:
+            n = struct.unpack("!H", await reader.readexactly(2))[0]
+        elif n == 127:
+            n = struct.unpack("!Q", await reader.readexactly(8))[0]
+        mask = await reader.readexactly(4) if b1 & 0x80 else b"\0\0\0\0"
+        data = bytes(b ^ mask[k % 4] for k, b in enumerate(await reader.readexactly(n)))
+        if opcode == 0x8:
+            writer.write(_frame(0x8, data[:2]))
+            return
+        if opcode == 0x9:
+            writer.write(_frame(0xA, data))
+        elif opcode in (0x1, 0x2):
+            on_message(data)
+
+async def serve(args):
+    state = initial_state(args.dims, args.balls, args.seed, args.radius)
+    world = make_engine("vector", args.dims, *state, sleeping=True, ccd=True)
+    server = StreamServer(world, args.rate, os.path.dirname(os.path.abspath(__file__)))
+    listener = await asyncio.start_server(server.handle, args.host, args.port)
+    page = "3dIndex.html" if args.dims == 3 else "index2.html"
+    print(f"Streaming {args.balls} balls; open http://{args.host}:{args.port}/{page}?stream")
+    async with listener:
+        await asyncio.gather(listener.serve_forever(), server.simulate(), server.report())
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a headless ball world to the HTML pages")
+    parser.add_argument("--dims", type=int, default=2, choices=(2, 3))
+    parser.add_argument("--balls", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--radius", type=int, nargs=2, default=None, metavar=("MIN", "MAX"))
+    parser.add_argument("--rate", type=float, default=60, help="physics ticks per second")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()